@@ -2,7 +2,8 @@
 debug_csrf2.py — финальная диагностика с явными куками
 """
 import sys, os, urllib.parse
-from bs4 import BeautifulSoup
+import requests
+import lxml.html
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from config import LOGIN_EMAIL, LOGIN_PASSWORD, BASE_URL
@@ -18,8 +19,10 @@ if not session:
     print("FAIL"); sys.exit(1)
 print("   OK")
 
-# Достаём реальную внутреннюю сессию
+# Достаём реальную внутреннюю сессию — одна и та же для GET и POST,
+# чтобы оба запроса шли по одному keep-alive соединению
 inner = session._session if hasattr(session, '_session') else session
+assert isinstance(inner, requests.Session), type(inner)
 
 print(f"\n2. Куки в inner._session:")
 for k, v in inner.cookies.items():
@@ -36,9 +39,9 @@ print("\n4. GET буста через inner напрямую...")
 resp = inner.get(BOOST_URL, timeout=15)
 print(f"   Статус: {resp.status_code}")
 
-soup = BeautifulSoup(resp.text, "html.parser")
-meta = soup.find("meta", {"name": "csrf-token"})
-meta_token = meta.get("content", "") if meta else ""
+# resp.content (байты) — lxml сам определит кодировку, без лишнего decode
+contents = lxml.html.fromstring(resp.content).xpath("//meta[@name='csrf-token']/@content")
+meta_token = contents[0] if contents else ""
 print(f"   meta csrf: {meta_token[:50] if meta_token else 'НЕ НАЙДЕН'}")
 
 print(f"\n5. POST через inner с meta токеном...")
@@ -1,11 +1,13 @@
 """Команды администратора."""
 
+import asyncio
 import logging
 from datetime import datetime, timedelta
+from typing import List
 from telegram import Update
 from telegram.ext import ContextTypes, CommandHandler
 
-from config import ADMIN_TG_ID
+from config import ADMIN_TG_ID, REQUIRED_TG_GROUP_ID
 from database import (
     get_all_users,
     delete_user,
@@ -14,10 +16,11 @@ from database import (
     get_all_booking_history,
     get_user_booking_history,
     get_booking,
-    cancel_booking,
-    add_booking_event
+    cancel_bookings_bulk,
+    get_bookings_for_schedule,
 )
-from schedule_view import format_all_history, format_user_history
+from timezone_utils import get_today_date, get_tomorrow_date
+from schedule_view import format_all_history, format_user_history, format_schedule
 from notifier import send_booking_cancelled_to_user, notify_group_booking_cancelled
 from database import mark_group_notified
 from weekly_stats import (
@@ -28,21 +31,32 @@ from weekly_stats import (
     get_week_start,
     get_week_end,
     ensure_weekly_tables,
+    send_or_update_weekly_pinned,
+    clear_pinned_message_info,
 )
+from card_info_parser import clear_card_name_cache
 from alliance_weekly_stats import (
     get_alliance_week_rows,
     get_alliance_available_weeks,
     format_alliance_weekly_message,
     format_alliance_week_range,
     get_alliance_week_start,
-    get_alliance_week_end,
-    ensure_alliance_weekly_tables,
     clear_pinned_alliance_message,
     send_or_update_alliance_pinned,
 )
 
 logger = logging.getLogger(__name__)
 
+# Лимит длины сообщения Telegram — 4096, оставляем запас
+TG_MESSAGE_LIMIT = 4000
+
+_USER_TMPL = (
+    "{status} {tg_nickname} (@{tg_username})\n"
+    "   TG ID: {tg_id}\n"
+    "   MB: {mangabuff_nick} (ID: {mangabuff_id})\n"
+    "   Верифицирован: {verified}\n\n"
+)
+
 
 # ══════════════════════════════════════════════════════════════
 # ДЕКОРАТОР ПРОВЕРКИ ПРАВ
@@ -59,6 +73,33 @@ def admin_only(func):
     return wrapper
 
 
+def _chunk_messages(blocks: List[str], limit: int = TG_MESSAGE_LIMIT) -> List[str]:
+    """
+    Собирает блоки текста в сообщения длиной не более limit.
+
+    Блоки (строки, записи) не разрываются между сообщениями, поэтому
+    эмодзи и HTML-теги не режутся посередине. Блок длиннее limit
+    режется по limit. Куски из одних пробелов и переводов строк
+    отбрасываются — Telegram отклоняет их как пустой текст.
+    """
+    messages = []
+    buf = []
+    size = 0
+    for block in blocks:
+        if buf and size + len(block) > limit:
+            messages.append("".join(buf))
+            buf = []
+            size = 0
+        while len(block) > limit:
+            messages.append(block[:limit])
+            block = block[limit:]
+        buf.append(block)
+        size += len(block)
+    if buf:
+        messages.append("".join(buf))
+    return [m for m in messages if m.strip()]
+
+
 # ══════════════════════════════════════════════════════════════
 # КОМАНДЫ АДМИНИСТРАТОРА
 # ══════════════════════════════════════════════════════════════
@@ -73,25 +114,21 @@ async def listusers_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("📋 Пользователей нет.")
         return
 
-    text = f"👥 Пользователи бота ({len(users)}):\n\n"
+    blocks = [f"👥 Пользователи бота ({len(users)}):\n\n"]
 
     for user in users:
-        status = "✅" if user.is_active else "⏸"
-        verified = "✓" if user.is_verified else "✗"
-
-        text += (
-            f"{status} {user.tg_nickname} (@{user.tg_username or 'нет'})\n"
-            f"   TG ID: {user.tg_id}\n"
-            f"   MB: {user.mangabuff_nick} (ID: {user.mangabuff_id})\n"
-            f"   Верифицирован: {verified}\n\n"
-        )
+        blocks.append(_USER_TMPL.format_map({
+            "status":         "✅" if user.is_active else "⏸",
+            "tg_nickname":    user.tg_nickname,
+            "tg_username":    user.tg_username or "нет",
+            "tg_id":          user.tg_id,
+            "mangabuff_nick": user.mangabuff_nick,
+            "mangabuff_id":   user.mangabuff_id,
+            "verified":       "✓" if user.is_verified else "✗",
+        }))
 
-    if len(text) > 4000:
-        parts = [text[i:i+4000] for i in range(0, len(text), 4000)]
-        for part in parts:
-            await update.message.reply_text(part)
-    else:
-        await update.message.reply_text(text)
+    for part in _chunk_messages(blocks):
+        await update.message.reply_text(part)
 
 
 @admin_only
@@ -172,10 +209,6 @@ async def syncclub_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 @admin_only
 async def allbookings_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает все активные брони."""
-    from database import get_bookings_for_schedule
-    from timezone_utils import get_today_date, get_tomorrow_date
-    from schedule_view import format_schedule
-
     today = get_today_date()
     tomorrow = get_tomorrow_date()
 
@@ -219,15 +252,10 @@ async def bookinghistory_command(update: Update, context: ContextTypes.DEFAULT_T
             return
 
         bookings = await get_user_booking_history(tg_id, limit=20)
-        text = f"📜 История броней: {user.tg_nickname}\n\n"
-        text += format_user_history(bookings)
+        text = f"📜 История броней: {user.tg_nickname}\n\n" + format_user_history(bookings)
 
-    if len(text) > 4000:
-        parts = [text[i:i+4000] for i in range(0, len(text), 4000)]
-        for part in parts:
-            await update.message.reply_text(part)
-    else:
-        await update.message.reply_text(text)
+    for part in _chunk_messages(text.splitlines(keepends=True)):
+        await update.message.reply_text(part)
 
 
 @admin_only
@@ -268,23 +296,27 @@ async def admincancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         )
         return
 
-    await cancel_booking(
-        booking_id,
+    # Статус и событие 'cancelled_admin' — одна транзакция
+    await cancel_bookings_bulk(
+        [booking_id],
         cancelled_by="admin",
         cancel_reason="Отменена администратором",
+        event_type="cancelled_admin",
         actor_tg_id=update.effective_user.id
     )
 
-    await add_booking_event(
-        booking_id,
-        "cancelled_admin",
-        "admin",
-        actor_tg_id=update.effective_user.id
+    # Уведомления независимы друг от друга — выполняем параллельно;
+    # ошибка одного не отменяет другое
+    bot = context.bot
+    results = await asyncio.gather(
+        send_booking_cancelled_to_user(bot, booking),
+        notify_group_booking_cancelled(bot, booking, "admin"),
+        return_exceptions=True,
     )
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Ошибка при отмене брони #{booking_id}: {result}", exc_info=result)
 
-    bot = context.bot
-    await send_booking_cancelled_to_user(bot, booking)
-    await notify_group_booking_cancelled(bot, booking, "admin")
     await mark_group_notified(booking_id)
 
     await update.message.reply_text(
@@ -386,14 +418,9 @@ async def weekstats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     text = "\n".join(lines)
 
-    # Разбиваем на части при необходимости
-    if len(text) > 4000:
-        parts = [text[i:i+4000] for i in range(0, len(text), 4000)]
-        for part in parts:
-            await update.message.reply_text(part, parse_mode="HTML",
-                                            disable_web_page_preview=True)
-    else:
-        await update.message.reply_text(text, parse_mode="HTML",
+    # Разбиваем на части по строкам, чтобы не резать HTML-теги
+    for part in _chunk_messages(text.splitlines(keepends=True)):
+        await update.message.reply_text(part, parse_mode="HTML",
                                         disable_web_page_preview=True)
 
     logger.info(
@@ -412,8 +439,6 @@ async def alliancestats_command(update: Update, context: ContextTypes.DEFAULT_TY
     - /alliancestats YYYY-MM-DD — неделя, содержащая эту дату
     - /alliancestats list      — список всех доступных недель
     """
-    await ensure_alliance_weekly_tables()
-
     arg = context.args[0] if context.args else None
 
     # ── Список доступных недель ──────────────────────────────
@@ -425,11 +450,8 @@ async def alliancestats_command(update: Update, context: ContextTypes.DEFAULT_TY
 
         lines = []
         for ws in weeks:
-            we = get_alliance_week_end(ws)
-            s = datetime.strptime(ws, "%Y-%m-%d")
-            e = datetime.strptime(we, "%Y-%m-%d")
             lines.append(
-                f"• {s.day:02d}.{s.month:02d} — {e.day:02d}.{e.month:02d}  "
+                f"• {format_alliance_week_range(ws)}  "
                 f"(запрос: /alliancestats {ws})"
             )
 
@@ -455,10 +477,7 @@ async def alliancestats_command(update: Update, context: ContextTypes.DEFAULT_TY
     # ── Получаем данные из БД ────────────────────────────────
     rows = await get_alliance_week_rows(week_start)
 
-    week_end = get_alliance_week_end(week_start)
-    s = datetime.strptime(week_start, "%Y-%m-%d")
-    e = datetime.strptime(week_end, "%Y-%m-%d")
-    range_str = f"{s.day:02d}.{s.month:02d} — {e.day:02d}.{e.month:02d}"
+    range_str = format_alliance_week_range(week_start)
 
     if not rows:
         await update.message.reply_text(
@@ -479,7 +498,7 @@ async def alliancestats_command(update: Update, context: ContextTypes.DEFAULT_TY
 
     for i, r in enumerate(rows, 1):
         prefix    = medals.get(i, f"{i}.")
-        url       = r.get("profile_url", "")
+        url       = r["profile_url"] or ""
         name      = f'<a href="{url}">{r["nick"]}</a>' if url else r["nick"]
         base      = r["contribution_baseline"]
         curr      = r["contribution_current"]
@@ -497,15 +516,9 @@ async def alliancestats_command(update: Update, context: ContextTypes.DEFAULT_TY
 
     text = "\n".join(lines)
 
-    if len(text) > 4000:
-        parts = [text[i:i+4000] for i in range(0, len(text), 4000)]
-        for part in parts:
-            await update.message.reply_text(
-                part, parse_mode="HTML", disable_web_page_preview=True
-            )
-    else:
+    for part in _chunk_messages(text.splitlines(keepends=True)):
         await update.message.reply_text(
-            text, parse_mode="HTML", disable_web_page_preview=True
+            part, parse_mode="HTML", disable_web_page_preview=True
         )
 
     logger.info(
@@ -520,8 +533,6 @@ async def refreshalliance_command(update: Update, context: ContextTypes.DEFAULT_
     Принудительно пересоздаёт закреплённое сообщение вкладов клуба в альянс.
     Полезно если сообщение было удалено или бот потерял message_id.
     """
-    from config import REQUIRED_TG_GROUP_ID
-
     await update.message.reply_text("⏳ Обновляю сообщение вкладов в альянс...")
 
     await clear_pinned_alliance_message(REQUIRED_TG_GROUP_ID)
@@ -546,14 +557,6 @@ async def refreshweekly_command(update: Update, context: ContextTypes.DEFAULT_TY
     Принудительно обновляет закреплённое сообщение недельной статистики.
     Полезно если бот потерял message_id или сообщение было удалено.
     """
-    from weekly_stats import (
-        get_week_contributions_from_db,
-        send_or_update_weekly_pinned,
-        clear_pinned_message_info,
-        get_week_start,
-    )
-    from config import REQUIRED_TG_GROUP_ID
-
     await update.message.reply_text("⏳ Обновляю закреплённое сообщение...")
 
     # Сбрасываем сохранённый message_id чтобы отправить новое сообщение
@@ -573,6 +576,17 @@ async def refreshweekly_command(update: Update, context: ContextTypes.DEFAULT_TY
     await update.message.reply_text("✅ Закреплённое сообщение обновлено.")
 
 
+@admin_only
+async def refreshcards_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Сбрасывает кэш названий карт — следующая смена карты заново
+    загрузит название со страницы (например, если на сайте его исправили).
+    """
+    clear_card_name_cache()
+    await update.message.reply_text("✅ Кэш названий карт сброшен.")
+    logger.info("Администратор сбросил кэш названий карт")
+
+
 # ══════════════════════════════════════════════════════════════
 # РЕГИСТРАЦИЯ HANDLERS
 # ══════════════════════════════════════════════════════════════
@@ -589,6 +603,7 @@ def register_admin_handlers(application):
     application.add_handler(CommandHandler("admincancel", admincancel_command))
     application.add_handler(CommandHandler("weekstats", weekstats_command))
     application.add_handler(CommandHandler("refreshweekly", refreshweekly_command))
+    application.add_handler(CommandHandler("refreshcards", refreshcards_command))
     application.add_handler(CommandHandler("alliancestats", alliancestats_command))
     application.add_handler(CommandHandler("refreshalliance", refreshalliance_command))
 
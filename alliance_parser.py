@@ -14,6 +14,7 @@
 
 import asyncio
 import logging
+import time
 from typing import Optional, Dict, Any
 
 import requests
@@ -23,14 +24,14 @@ from config import (
     BASE_URL, ALLIANCE_URL, ALLIANCE_CHECK_INTERVAL,
     LOGIN_EMAIL, LOGIN_PASSWORD,
 )
-from timezone_utils import ts_for_db, now_msk
+from timezone_utils import ts_for_db, now_msk, now_for_db
 from alliance_weekly_stats import (
     CLUB_PAGE_ATTR,
-    parse_alliance_club_contributions,
-    compute_alliance_hash,
+    parse_alliance_club_contributions_async,
+    build_upsert_batch,
     get_alliance_week_start,
     get_alliance_week_rows,
-    upsert_alliance_contributions,
+    upsert_alliance_rows,
     send_or_update_alliance_pinned,
     send_alliance_week_archive_message,
 )
@@ -78,7 +79,7 @@ class AllianceParser:
                         f"[Alliance] HTTP 500 (попытка {attempt + 1}/{self.MAX_RETRIES})"
                     )
                     if attempt < self.MAX_RETRIES - 1:
-                        import time; time.sleep(self.RETRY_DELAY)
+                        time.sleep(self.RETRY_DELAY)
                     continue
 
                 if response.status_code == 403:
@@ -91,7 +92,7 @@ class AllianceParser:
                         f"(попытка {attempt + 1}/{self.MAX_RETRIES})"
                     )
                     if attempt < self.MAX_RETRIES - 1:
-                        import time; time.sleep(self.RETRY_DELAY)
+                        time.sleep(self.RETRY_DELAY)
                     continue
 
                 # Проверяем, не пришла ли страница логина вместо альянса
@@ -106,17 +107,17 @@ class AllianceParser:
                     f"[Alliance] Таймаут (попытка {attempt + 1}/{self.MAX_RETRIES})"
                 )
                 if attempt < self.MAX_RETRIES - 1:
-                    import time; time.sleep(self.RETRY_DELAY)
+                    time.sleep(self.RETRY_DELAY)
             except requests.exceptions.ConnectionError:
                 logger.warning(
                     f"[Alliance] Ошибка соединения (попытка {attempt + 1}/{self.MAX_RETRIES})"
                 )
                 if attempt < self.MAX_RETRIES - 1:
-                    import time; time.sleep(self.RETRY_DELAY)
+                    time.sleep(self.RETRY_DELAY)
             except Exception as e:
                 logger.error(f"[Alliance] Ошибка загрузки: {e}", exc_info=True)
                 if attempt < self.MAX_RETRIES - 1:
-                    import time; time.sleep(self.RETRY_DELAY)
+                    time.sleep(self.RETRY_DELAY)
 
         return None
 
@@ -125,7 +126,7 @@ class AllianceParser:
     def get_current_manga_slug(self, html: str) -> Optional[str]:
         """Извлекает slug текущей манги из уже загруженного HTML."""
         try:
-            soup = BeautifulSoup(html, "html.parser")
+            soup = BeautifulSoup(html, "lxml")
 
             manga_link = soup.find("a", class_="card-show__placeholder")
             if manga_link:
@@ -160,10 +161,10 @@ class AllianceParser:
 
                 if response.status_code not in (200,):
                     if attempt < self.MAX_RETRIES - 1:
-                        import time; time.sleep(self.RETRY_DELAY)
+                        time.sleep(self.RETRY_DELAY)
                     continue
 
-                soup = BeautifulSoup(response.text, "html.parser")
+                soup = BeautifulSoup(response.text, "lxml")
 
                 title = None
                 for cls in ("manga-mobile__name", "manga__name"):
@@ -193,7 +194,7 @@ class AllianceParser:
                     "title":         title,
                     "image":         img_src,
                     "url":           f"{BASE_URL}/manga/{manga_slug}",
-                    "discovered_at": ts_for_db(now_msk()),
+                    "discovered_at": now_for_db(),
                 }
 
             except Exception as e:
@@ -202,7 +203,7 @@ class AllianceParser:
                     exc_info=True
                 )
                 if attempt < self.MAX_RETRIES - 1:
-                    import time; time.sleep(self.RETRY_DELAY)
+                    time.sleep(self.RETRY_DELAY)
 
         return None
 
@@ -268,7 +269,9 @@ async def alliance_monitor_loop(session, bot):
 
     current_slug: Optional[str] = None
     if start_html:
-        current_slug = parser.get_current_manga_slug(start_html)
+        current_slug = await loop.run_in_executor(
+            None, parser.get_current_manga_slug, start_html
+        )
 
     saved = await get_current_alliance_manga()
 
@@ -298,17 +301,16 @@ async def alliance_monitor_loop(session, bot):
     # is_new_week=True ставим только если данных нет вообще.
 
     if start_html:
-        contributions = parse_alliance_club_contributions(start_html)
+        contributions = await parse_alliance_club_contributions_async(start_html)
         if contributions:
             existing_rows = await get_alliance_week_rows(last_week_start)
             is_fresh_week = len(existing_rows) == 0
 
-            await upsert_alliance_contributions(
-                last_week_start, contributions, is_new_week=is_fresh_week
-            )
+            batch, start_hash = build_upsert_batch(contributions, last_week_start)
+            await upsert_alliance_rows(batch, is_new_week=is_fresh_week)
             rows = await get_alliance_week_rows(last_week_start)
             await send_or_update_alliance_pinned(bot, rows, last_week_start)
-            last_club_hash = compute_alliance_hash(contributions)
+            last_club_hash = start_hash
 
             if is_fresh_week:
                 logger.info(
@@ -352,13 +354,17 @@ async def alliance_monitor_loop(session, bot):
 
             # Успешная загрузка — сбрасываем счётчик ошибок
             consecutive_failures = 0
-            current_week_start   = get_alliance_week_start()
+            # Часы читаются один раз за цикл опроса
+            now                  = now_msk()
+            current_week_start   = get_alliance_week_start(now)
 
             # ══════════════════════════════════════════════════
             # СМЕНА МАНГИ
             # ══════════════════════════════════════════════════
 
-            new_slug = parser.get_current_manga_slug(html)
+            new_slug = await loop.run_in_executor(
+                None, parser.get_current_manga_slug, html
+            )
             if new_slug and new_slug != current_slug:
                 logger.info(
                     f"[Alliance] Смена тайтла: {current_slug} → {new_slug}"
@@ -380,13 +386,16 @@ async def alliance_monitor_loop(session, bot):
             # МОНИТОРИНГ ВКЛАДОВ КЛУБА
             # ══════════════════════════════════════════════════
 
-            contributions = parse_alliance_club_contributions(html)
+            contributions = await parse_alliance_club_contributions_async(html)
             if not contributions:
                 if check_count % 60 == 0:
                     logger.debug("[Alliance] Вклады клуба не найдены")
                 continue
 
-            current_hash = compute_alliance_hash(contributions)
+            # Строки для upsert и хеш — за один проход по вкладам
+            batch, current_hash = build_upsert_batch(
+                contributions, current_week_start, ts_for_db(now)
+            )
 
             # ── Смена недели ─────────────────────────────────
             if current_week_start != last_week_start:
@@ -402,21 +411,18 @@ async def alliance_monitor_loop(session, bot):
                     logger.info(f"[Alliance] Итоги недели {last_week_start} отправлены")
 
                 # 2. Начинаем новую неделю: baseline = текущие значения
-                await upsert_alliance_contributions(
-                    current_week_start, contributions, is_new_week=True
-                )
+                await upsert_alliance_rows(batch, is_new_week=True)
                 last_week_start = current_week_start
                 last_club_hash  = None   # гарантируем обновление закреплённого
 
             # ── Данные изменились ────────────────────────────
             if current_hash != last_club_hash:
-                await upsert_alliance_contributions(
-                    current_week_start,
-                    contributions,
+                await upsert_alliance_rows(
+                    batch,
                     is_new_week=False,  # baseline уже установлен — не трогаем
                 )
                 rows = await get_alliance_week_rows(current_week_start)
-                await send_or_update_alliance_pinned(bot, rows, current_week_start)
+                await send_or_update_alliance_pinned(bot, rows, current_week_start, now)
                 last_club_hash = current_hash
 
                 top = max(
@@ -2,18 +2,25 @@
 Модуль мониторинга вкладов клуба в альянс.
 """
 
+import asyncio
+import functools
 import hashlib
 import logging
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from io import BytesIO
+from operator import attrgetter, itemgetter
+from typing import List, Dict, Optional, Tuple
 
 import aiosqlite
-from bs4 import BeautifulSoup
+from lxml import etree
+from lxml.etree import XPath
 from telegram import Bot
 from telegram.error import TelegramError
 
 from config import BASE_URL, REQUIRED_TG_GROUP_ID, GROUP_ALLIANCE_TOPIC_ID
-from timezone_utils import now_msk, ts_for_db
+from html_utils import USER_ID_RE, xp_class
+from timezone_utils import now_msk, ts_for_db, now_for_db
 
 logger = logging.getLogger(__name__)
 DB_PATH = "bot_data.db"
@@ -21,6 +28,37 @@ DB_PATH = "bot_data.db"
 CLUB_PAGE_ATTR = "club64"
 
 
+# XPath-выражения компилируются один раз при импорте модуля
+_ITEM_CLASS = "club-boost__top-item"
+_XP_NAME    = XPath(".//" + xp_class("a", "club-boost__top-name"))
+_XP_CONTRIB = XPath(".//" + xp_class("*", "club-boost__top-contribution"))
+
+_MEDALS = {1: "🥇", 2: "🥈", 3: "🥉"}
+
+# Формат строки «Обновлено» в закреплённом сообщении
+_UPDATED_FMT = "%d.%m %H:%M МСК"
+
+
+@dataclass(slots=True)
+class AllianceContribution:
+    """Вклад участника клуба, спарсенный со страницы альянса."""
+    mangabuff_id: int
+    nick: str
+    profile_url: str
+    contribution: int
+
+
+_BY_MANGABUFF_ID = attrgetter("mangabuff_id")
+
+# Общее соединение модуля: открывается лениво один раз на процесс
+_DB: Optional[aiosqlite.Connection] = None
+_DB_LOCK = asyncio.Lock()
+# Сериализует пишущие транзакции на общем соединении. Читатели берут его
+# тоже: на том же соединении они иначе увидят незакоммиченный батч
+# upsert_alliance_rows, который ещё может откатиться
+_WRITE_LOCK = asyncio.Lock()
+
+
 # ══════════════════════════════════════════════════════════════
 # УТИЛИТЫ НЕДЕЛИ
 # ══════════════════════════════════════════════════════════════
@@ -33,15 +71,18 @@ def get_alliance_week_start(dt: datetime = None) -> str:
     return monday.isoformat()
 
 
+@functools.lru_cache(maxsize=8)
 def get_alliance_week_end(week_start: str) -> str:
-    monday = datetime.strptime(week_start, "%Y-%m-%d").date()
+    monday = date.fromisoformat(week_start)
     return (monday + timedelta(days=6)).isoformat()
 
 
+@functools.lru_cache(maxsize=8)
 def format_alliance_week_range(week_start: str) -> str:
-    week_end = get_alliance_week_end(week_start)
-    s = datetime.strptime(week_start, "%Y-%m-%d")
-    e = datetime.strptime(week_end, "%Y-%m-%d")
+    # Чистая функция от week_start — результат кэшируется.
+    # Один fromisoformat вместо трёх strptime
+    s = date.fromisoformat(week_start)
+    e = s + timedelta(days=6)
     return f"{s.day:02d}.{s.month:02d} — {e.day:02d}.{e.month:02d}"
 
 
@@ -50,49 +91,96 @@ def format_alliance_week_range(week_start: str) -> str:
 # ══════════════════════════════════════════════════════════════
 
 
+async def _create_alliance_tables(db: aiosqlite.Connection):
+    # WAL: читатели не блокируют запись вкладов
+    await db.execute("PRAGMA journal_mode=WAL")
+    await db.execute("PRAGMA synchronous=NORMAL")
+    # Небольшие таблицы альянса целиком держим в кэше страниц (16 МБ),
+    # временные структуры — в памяти
+    await db.execute("PRAGMA cache_size=-16000")
+    await db.execute("PRAGMA temp_store=MEMORY")
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS alliance_club_contributions (
+            id                      INTEGER PRIMARY KEY AUTOINCREMENT,
+            week_start              TEXT NOT NULL,
+            mangabuff_id            INTEGER NOT NULL,
+            nick                    TEXT NOT NULL,
+            profile_url             TEXT,
+            contribution_baseline   INTEGER NOT NULL DEFAULT 0,
+            contribution_current    INTEGER NOT NULL DEFAULT 0,
+            updated_at              TEXT NOT NULL,
+            UNIQUE(week_start, mangabuff_id)
+        )
+    """)
+    # Отдельный индекс (week_start, contribution_current DESC) не нужен:
+    # строки недели находятся по UNIQUE(week_start, mangabuff_id), а
+    # сортировка десятков строк дешевле, чем обновлять индекс при каждом
+    # upsert-е раз в минуту. Удаляем его из уже существующих баз.
+    await db.execute("DROP INDEX IF EXISTS idx_alliance_club_week")
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS pinned_alliance_weekly_message (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id     INTEGER NOT NULL UNIQUE,
+            thread_id   INTEGER,
+            message_id  INTEGER NOT NULL,
+            week_start  TEXT NOT NULL,
+            updated_at  TEXT NOT NULL,
+            text_hash   TEXT
+        )
+    """)
+    # Миграция старых БД: колонка text_hash появилась позже
+    async with db.execute("PRAGMA table_info(pinned_alliance_weekly_message)") as cursor:
+        columns = {row[1] for row in await cursor.fetchall()}
+    if "text_hash" not in columns:
+        await db.execute("ALTER TABLE pinned_alliance_weekly_message ADD COLUMN text_hash TEXT")
+    # ── Архив завершённых недель ─────────────────────────
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS alliance_weekly_archive (
+            id                  INTEGER PRIMARY KEY AUTOINCREMENT,
+            week_start          TEXT NOT NULL UNIQUE,
+            week_end            TEXT NOT NULL,
+            message_text        TEXT NOT NULL,
+            total_delta         INTEGER NOT NULL DEFAULT 0,
+            participants_count  INTEGER NOT NULL DEFAULT 0,
+            archived_at         TEXT NOT NULL,
+            tg_message_id       INTEGER
+        )
+    """)
+    await db.commit()
+
+
+async def _get_db() -> aiosqlite.Connection:
+    """Возвращает общее соединение, при первом вызове открывает его и создаёт таблицы."""
+    global _DB
+    if _DB is None:
+        async with _DB_LOCK:
+            if _DB is None:
+                # Автокоммит: одиночные записи не оборачиваются в неявный
+                # BEGIN, батчи открывают транзакцию явно (BEGIN IMMEDIATE)
+                db = await aiosqlite.connect(DB_PATH, isolation_level=None)
+                db.row_factory = aiosqlite.Row
+                await _create_alliance_tables(db)
+                _DB = db
+    return _DB
+
+
 async def ensure_alliance_weekly_tables():
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS alliance_club_contributions (
-                id                      INTEGER PRIMARY KEY AUTOINCREMENT,
-                week_start              TEXT NOT NULL,
-                mangabuff_id            INTEGER NOT NULL,
-                nick                    TEXT NOT NULL,
-                profile_url             TEXT,
-                contribution_baseline   INTEGER NOT NULL DEFAULT 0,
-                contribution_current    INTEGER NOT NULL DEFAULT 0,
-                updated_at              TEXT NOT NULL,
-                UNIQUE(week_start, mangabuff_id)
-            )
-        """)
-        await db.execute("""
-            CREATE INDEX IF NOT EXISTS idx_alliance_club_week
-            ON alliance_club_contributions(week_start, contribution_current DESC)
-        """)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS pinned_alliance_weekly_message (
-                id          INTEGER PRIMARY KEY AUTOINCREMENT,
-                chat_id     INTEGER NOT NULL UNIQUE,
-                thread_id   INTEGER,
-                message_id  INTEGER NOT NULL,
-                week_start  TEXT NOT NULL,
-                updated_at  TEXT NOT NULL
-            )
-        """)
-        # ── Архив завершённых недель ─────────────────────────
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS alliance_weekly_archive (
-                id                  INTEGER PRIMARY KEY AUTOINCREMENT,
-                week_start          TEXT NOT NULL UNIQUE,
-                week_end            TEXT NOT NULL,
-                message_text        TEXT NOT NULL,
-                total_delta         INTEGER NOT NULL DEFAULT 0,
-                participants_count  INTEGER NOT NULL DEFAULT 0,
-                archived_at         TEXT NOT NULL,
-                tg_message_id       INTEGER
-            )
-        """)
-        await db.commit()
+    """Гарантирует наличие таблиц (создаются при открытии общего соединения)."""
+    await _get_db()
+
+
+async def init_alliance_module():
+    """Открывает соединение и создаёт таблицы один раз при старте бота."""
+    await ensure_alliance_weekly_tables()
+    logger.info("✅ Таблицы альянса инициализированы")
+
+
+async def close_alliance_db():
+    """Закрывает общее соединение модуля (при остановке бота)."""
+    global _DB
+    if _DB is not None:
+        await _DB.close()
+        _DB = None
 
 
 # ══════════════════════════════════════════════════════════════
@@ -100,55 +188,129 @@ async def ensure_alliance_weekly_tables():
 # ══════════════════════════════════════════════════════════════
 
 
-def parse_alliance_club_contributions(html: str, club_page: str = CLUB_PAGE_ATTR) -> List[Dict]:
-    soup = BeautifulSoup(html, "html.parser")
-    club_div = soup.find("div", attrs={"data-page": club_page})
+def _parse_alliance_item(item) -> Optional[AllianceContribution]:
+    name_links = _XP_NAME(item)
+    if not name_links:
+        return None
+    name_link = name_links[0]
+
+    nick = "".join(name_link.itertext()).strip()
+    href = name_link.get("href", "")
+
+    match = USER_ID_RE.search(href)
+    mangabuff_id = int(match.group(1)) if match else 0
+    profile_url = (f"{BASE_URL}{href}" if href.startswith("/") else href)
+
+    # Вклад — неотрицательное целое: проверка isdecimal() вместо try/except
+    contrib_els = _XP_CONTRIB(item)
+    txt = "".join(contrib_els[0].itertext()).strip() if contrib_els else ""
+    contribution = int(txt) if txt.isdecimal() else 0
+
+    return AllianceContribution(mangabuff_id, nick, profile_url, contribution)
+
+
+def parse_alliance_club_contributions(
+    html: str,
+    club_page: str = CLUB_PAGE_ATTR,
+) -> List[AllianceContribution]:
+    # Потоковый разбор: участник обрабатывается при закрытии его тега и сразу
+    # удаляется из дерева, так что в памяти не держится весь DOM
+    events = etree.iterparse(
+        BytesIO(html.encode("utf-8")),
+        events=("start", "end"),
+        html=True,
+        encoding="utf-8",
+    )
 
-    if not club_div:
+    tabs: List[str] = []
+    club_div = None
+    found = False
+    results = []
+
+    # iterparse бросает XMLSyntaxError на пустом документе — для вызывающего
+    # это тот же случай «блок не найден», что и раньше с bs4
+    try:
+        for event, elem in events:
+            if event == "start":
+                page = elem.get("data-page")
+                if page is not None:
+                    tabs.append(page)
+                    if not found and elem.tag == "div" and page == club_page:
+                        club_div = elem
+                        found = True
+                continue
+
+            if club_div is None:
+                continue
+            if elem is club_div:
+                break
+
+            if _ITEM_CLASS in elem.get("class", "").split():
+                row = _parse_alliance_item(elem)
+                if row:
+                    results.append(row)
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+    except etree.XMLSyntaxError as e:
+        logger.debug(f"[Alliance club] Ошибка разбора HTML: {e}")
+
+    if not found:
         logger.warning(
             f"Блок data-page='{club_page}' не найден. "
             f"Доступные табы: "
-            + str([d.get("data-page") for d in soup.find_all(attrs={"data-page": True})])
+            + str(tabs)
         )
         return []
 
-    results = []
-    import re
-    for item in club_div.select(".club-boost__top-item"):
-        name_link = item.select_one("a.club-boost__top-name")
-        if not name_link:
-            continue
-
-        nick = name_link.text.strip()
-        href = name_link.get("href", "")
+    logger.debug(f"[Alliance club] Спарсено {len(results)} участников из блока '{club_page}'")
+    return results
 
-        match = re.search(r"/users/(\d+)", href)
-        mangabuff_id = int(match.group(1)) if match else 0
-        profile_url = (f"{BASE_URL}{href}" if href.startswith("/") else href)
 
-        contrib_el = item.select_one(".club-boost__top-contribution")
-        try:
-            contribution = int(contrib_el.text.strip()) if contrib_el else 0
-        except ValueError:
-            contribution = 0
+async def parse_alliance_club_contributions_async(
+    html: str,
+    club_page: str = CLUB_PAGE_ATTR,
+) -> List[AllianceContribution]:
+    """Разбор HTML в пуле потоков — CPU-работа не блокирует event loop бота."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, parse_alliance_club_contributions, html, club_page
+    )
 
-        results.append({
-            "mangabuff_id": mangabuff_id,
-            "nick":         nick,
-            "profile_url":  profile_url,
-            "contribution": contribution,
-        })
 
-    logger.debug(f"[Alliance club] Спарсено {len(results)} участников из блока '{club_page}'")
-    return results
+def build_upsert_batch(
+    contributions: List[AllianceContribution],
+    week_start: str,
+    updated_at: Optional[str] = None,
+) -> Tuple[List[tuple], str]:
+    """
+    За один проход по вкладам готовит строки для upsert и хеш вкладов.
+    """
+    if updated_at is None:
+        updated_at = now_for_db()
+
+    # Дайджест нужен только для сравнения — хешируем потоково, без общей строки.
+    # Сортировка по id: перестановка строк на странице не меняет хеш
+    h = hashlib.blake2b(digest_size=16)
+    rows = []
+    for c in sorted(contributions, key=_BY_MANGABUFF_ID):
+        mangabuff_id = c.mangabuff_id
+        contribution = c.contribution
+        h.update(f"{mangabuff_id}:{contribution},".encode())
+        rows.append((
+            week_start, mangabuff_id, c.nick, c.profile_url,
+            contribution, contribution, updated_at,
+        ))
+    return rows, h.hexdigest()
 
 
-def compute_alliance_hash(contributions: List[Dict]) -> str:
-    data = ",".join(
-        f"{c['mangabuff_id']}:{c['contribution']}"
-        for c in contributions
-    )
-    return hashlib.md5(data.encode()).hexdigest()
+def compute_alliance_text_hash(text: str) -> str:
+    """
+    Хеш текста закреплённого сообщения без последней строки —
+    «Обновлено: ...» меняется каждую минуту и не отражает данные.
+    """
+    body = text.rsplit("\n", 1)[0]
+    return hashlib.blake2b(body.encode(), digest_size=16).hexdigest()
 
 
 # ══════════════════════════════════════════════════════════════
@@ -156,22 +318,26 @@ def compute_alliance_hash(contributions: List[Dict]) -> str:
 # ══════════════════════════════════════════════════════════════
 
 
-async def get_alliance_week_rows(week_start: str) -> List[Dict]:
-    await ensure_alliance_weekly_tables()
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+async def get_alliance_week_rows(week_start: str) -> List[aiosqlite.Row]:
+    """
+    Строки недели как aiosqlite.Row (без копирования в dict).
+    Row поддерживает доступ по имени колонки, но не .get().
+    Выбираются только колонки, нужные для рендера и подсчёта прироста.
+    """
+    db = await _get_db()
+    async with _WRITE_LOCK:
         async with db.execute("""
-            SELECT * FROM alliance_club_contributions
+            SELECT nick, profile_url, contribution_baseline, contribution_current
+            FROM alliance_club_contributions
             WHERE week_start = ?
             ORDER BY contribution_current DESC
         """, (week_start,)) as cursor:
-            rows = await cursor.fetchall()
-            return [dict(r) for r in rows]
+            return list(await cursor.fetchall())
 
 
 async def get_alliance_available_weeks() -> List[str]:
-    await ensure_alliance_weekly_tables()
-    async with aiosqlite.connect(DB_PATH) as db:
+    db = await _get_db()
+    async with _WRITE_LOCK:
         async with db.execute("""
             SELECT DISTINCT week_start FROM alliance_club_contributions
             ORDER BY week_start DESC
@@ -180,47 +346,46 @@ async def get_alliance_available_weeks() -> List[str]:
             return [r[0] for r in rows]
 
 
-async def upsert_alliance_contributions(
-    week_start: str,
-    contributions: List[Dict],
-    is_new_week: bool,
-):
-    await ensure_alliance_weekly_tables()
-    updated_at = ts_for_db(now_msk())
-
-    async with aiosqlite.connect(DB_PATH) as db:
-        for c in contributions:
-            if is_new_week:
-                # Новая неделя: baseline = текущее значение (прирост начинается с 0)
-                await db.execute("""
-                    INSERT INTO alliance_club_contributions
-                        (week_start, mangabuff_id, nick, profile_url,
-                         contribution_baseline, contribution_current, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                    ON CONFLICT(week_start, mangabuff_id) DO UPDATE SET
-                        nick                   = excluded.nick,
-                        contribution_baseline  = excluded.contribution_baseline,
-                        contribution_current   = excluded.contribution_current,
-                        updated_at             = excluded.updated_at
-                """, (
-                    week_start, c["mangabuff_id"], c["nick"], c["profile_url"],
-                    c["contribution"], c["contribution"], updated_at,
-                ))
-            else:
-                # Обновление текущей недели: baseline НЕ трогаем
-                await db.execute("""
-                    INSERT INTO alliance_club_contributions
-                        (week_start, mangabuff_id, nick, profile_url,
-                         contribution_baseline, contribution_current, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                    ON CONFLICT(week_start, mangabuff_id) DO UPDATE SET
-                        nick                  = excluded.nick,
-                        contribution_current  = excluded.contribution_current,
-                        updated_at            = excluded.updated_at
-                """, (
-                    week_start, c["mangabuff_id"], c["nick"], c["profile_url"],
-                    c["contribution"], c["contribution"], updated_at,
-                ))
+# SQL upsert-ов — модульные константы: один и тот же объект строки
+# попадает в кэш подготовленных запросов sqlite3 и не парсится заново.
+# Конфликт проверяется по индексу UNIQUE(week_start, mangabuff_id).
+
+# Новая неделя: baseline = текущее значение (прирост начинается с 0).
+# Перезаписываются все столбцы строки, поэтому ветка DO UPDATE не нужна —
+# хватает INSERT OR REPLACE.
+_SQL_NEW_WEEK = """
+    INSERT OR REPLACE INTO alliance_club_contributions
+        (week_start, mangabuff_id, nick, profile_url,
+         contribution_baseline, contribution_current, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Обновление текущей недели: baseline НЕ трогаем. Остаётся upsert, а не
+# UPDATE — участник, вступивший в клуб посреди недели, должен добавиться
+# (его baseline = первое увиденное значение).
+_SQL_SAME_WEEK = """
+    INSERT INTO alliance_club_contributions
+        (week_start, mangabuff_id, nick, profile_url,
+         contribution_baseline, contribution_current, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(week_start, mangabuff_id) DO UPDATE SET
+        nick                  = excluded.nick,
+        contribution_current  = excluded.contribution_current,
+        updated_at            = excluded.updated_at
+"""
+
+
+async def upsert_alliance_rows(rows: List[tuple], is_new_week: bool):
+    """Записывает готовый батч из build_upsert_batch."""
+    db = await _get_db()
+    async with _WRITE_LOCK:
+        # Одна транзакция и один подготовленный запрос на весь батч
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            await db.executemany(_SQL_NEW_WEEK if is_new_week else _SQL_SAME_WEEK, rows)
+        except Exception:
+            await db.rollback()
+            raise
         await db.commit()
 
 
@@ -229,51 +394,44 @@ async def upsert_alliance_contributions(
 # ══════════════════════════════════════════════════════════════
 
 
-async def get_alliance_archive_weeks() -> List[Dict]:
-    """Возвращает список архивированных недель."""
-    await ensure_alliance_weekly_tables()
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("""
-            SELECT * FROM alliance_weekly_archive
-            ORDER BY week_start DESC
-        """) as cursor:
-            rows = await cursor.fetchall()
-            return [dict(r) for r in rows]
-
-
-async def archive_alliance_week(week_start: str, rows: List[Dict]) -> Optional[str]:
+def _active_by_delta(rows) -> Tuple[List[tuple], int]:
+    """
+    Один проход по строкам: прирост считается один раз.
+    Возвращает ([(delta, row), ...] с delta > 0 по убыванию, общий прирост).
+    """
+    total_delta = 0
+    active_rows = []
+    for r in rows:
+        delta = r["contribution_current"] - r["contribution_baseline"]
+        total_delta += delta
+        if delta > 0:
+            active_rows.append((delta, r))
+    active_rows.sort(key=itemgetter(0), reverse=True)
+    return active_rows, total_delta
+
+
+async def archive_alliance_week(week_start: str, rows: List[aiosqlite.Row]) -> Optional[str]:
     """
     Сохраняет итоги недели в архив.
     Возвращает текст итогового сообщения или None если нечего архивировать.
     """
-    await ensure_alliance_weekly_tables()
-
-    active_rows = [r for r in rows if r["contribution_current"] - r["contribution_baseline"] > 0]
+    active_rows, total_delta = _active_by_delta(rows)
     if not active_rows:
         logger.info(f"[Alliance archive] Неделя {week_start}: нет активных вкладчиков, пропускаем")
         return None
 
-    active_rows.sort(
-        key=lambda r: r["contribution_current"] - r["contribution_baseline"],
-        reverse=True
-    )
-
-    total_delta = sum(r["contribution_current"] - r["contribution_baseline"] for r in rows)
     week_end    = get_alliance_week_end(week_start)
     date_range  = format_alliance_week_range(week_start)
 
-    medals = {1: "🥇", 2: "🥈", 3: "🥉"}
-    lines  = [f"🏆 <b>Итоги вкладов в альянс</b> ({date_range})\n"]
+    lines = [f"🏆 <b>Итоги вкладов в альянс</b> ({date_range})\n"]
 
-    for i, r in enumerate(active_rows, 1):
-        url   = r.get("profile_url", "")
+    for i, (delta, r) in enumerate(active_rows, 1):
+        url   = r["profile_url"] or ""
         nick  = r["nick"]
         base  = r["contribution_baseline"]
         curr  = r["contribution_current"]
-        delta = curr - base
         name  = f'<a href="{url}">{nick}</a>' if url else nick
-        lines.append(f"{medals.get(i, f'{i}.')} {name} — +{delta} ({base}→{curr})")
+        lines.append(f"{_MEDALS.get(i, f'{i}.')} {name} — +{delta} ({base}→{curr})")
 
     lines.append(f"\n👥 Вкладчиков: {len(active_rows)}")
     lines.append(f"📈 Общий прирост за неделю: <b>+{total_delta}</b>")
@@ -281,7 +439,8 @@ async def archive_alliance_week(week_start: str, rows: List[Dict]) -> Optional[s
 
     text = "\n".join(lines)
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    db = await _get_db()
+    async with _WRITE_LOCK:
         await db.execute("""
             INSERT INTO alliance_weekly_archive
                 (week_start, week_end, message_text, total_delta,
@@ -294,7 +453,7 @@ async def archive_alliance_week(week_start: str, rows: List[Dict]) -> Optional[s
                 archived_at        = excluded.archived_at
         """, (
             week_start, week_end, text, total_delta,
-            len(active_rows), ts_for_db(now_msk()),
+            len(active_rows), now_for_db(),
         ))
         await db.commit()
 
@@ -308,7 +467,7 @@ async def archive_alliance_week(week_start: str, rows: List[Dict]) -> Optional[s
 async def send_alliance_week_archive_message(
     bot: Bot,
     week_start: str,
-    rows: List[Dict],
+    rows: List[aiosqlite.Row],
 ) -> bool:
     """
     Отправляет итоговое сообщение в топик и сохраняет в архив.
@@ -327,7 +486,8 @@ async def send_alliance_week_archive_message(
             disable_web_page_preview=True,
         )
         # Сохраняем ID сообщения в архиве
-        async with aiosqlite.connect(DB_PATH) as db:
+        db = await _get_db()
+        async with _WRITE_LOCK:
             await db.execute("""
                 UPDATE alliance_weekly_archive
                 SET tg_message_id = ?
@@ -349,11 +509,11 @@ async def send_alliance_week_archive_message(
 
 
 async def get_pinned_alliance_message(chat_id: int) -> Optional[Dict]:
-    await ensure_alliance_weekly_tables()
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    db = await _get_db()
+    async with _WRITE_LOCK:
         async with db.execute(
-            "SELECT * FROM pinned_alliance_weekly_message WHERE chat_id = ?",
+            "SELECT message_id, week_start, text_hash "
+            "FROM pinned_alliance_weekly_message WHERE chat_id = ?",
             (chat_id,)
         ) as cursor:
             row = await cursor.fetchone()
@@ -365,25 +525,35 @@ async def save_pinned_alliance_message(
     thread_id: Optional[int],
     message_id: int,
     week_start: str,
-):
-    await ensure_alliance_weekly_tables()
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("""
+    text_hash: Optional[str] = None,
+    updated_at: Optional[str] = None,
+) -> Dict:
+    """Сохраняет закреплённое сообщение и возвращает итоговую строку (без повторного SELECT)."""
+    db = await _get_db()
+    async with _WRITE_LOCK:
+        async with db.execute("""
             INSERT INTO pinned_alliance_weekly_message
-                (chat_id, thread_id, message_id, week_start, updated_at)
-            VALUES (?, ?, ?, ?, ?)
+                (chat_id, thread_id, message_id, week_start, updated_at, text_hash)
+            VALUES (?, ?, ?, ?, ?, ?)
             ON CONFLICT(chat_id) DO UPDATE SET
                 thread_id  = excluded.thread_id,
                 message_id = excluded.message_id,
                 week_start = excluded.week_start,
-                updated_at = excluded.updated_at
-        """, (chat_id, thread_id, message_id, week_start, ts_for_db(now_msk())))
+                updated_at = excluded.updated_at,
+                text_hash  = excluded.text_hash
+            RETURNING chat_id, thread_id, message_id, week_start, updated_at, text_hash
+        """, (
+            chat_id, thread_id, message_id, week_start,
+            updated_at or now_for_db(), text_hash,
+        )) as cursor:
+            row = await cursor.fetchone()
         await db.commit()
+    return dict(row)
 
 
 async def clear_pinned_alliance_message(chat_id: int):
-    await ensure_alliance_weekly_tables()
-    async with aiosqlite.connect(DB_PATH) as db:
+    db = await _get_db()
+    async with _WRITE_LOCK:
         await db.execute(
             "DELETE FROM pinned_alliance_weekly_message WHERE chat_id = ?",
             (chat_id,)
@@ -396,18 +566,21 @@ async def clear_pinned_alliance_message(chat_id: int):
 # ══════════════════════════════════════════════════════════════
 
 
-def format_alliance_weekly_message(rows: list, week_start: str) -> str:
+def format_alliance_weekly_message(
+    rows: List[aiosqlite.Row],
+    week_start: str,
+    now: Optional[datetime] = None,
+) -> str:
     """
     Показывает только тех, кто реально вкладывал за неделю (delta > 0),
     отсортированных по приросту по убыванию.
+
+    now — момент для строки «Обновлено» (по умолчанию now_msk()).
     """
     date_range = format_alliance_week_range(week_start)
+    active_rows, total_delta = _active_by_delta(rows)
 
-    active_rows = [r for r in rows if r["contribution_current"] - r["contribution_baseline"] > 0]
-    active_rows.sort(key=lambda r: r["contribution_current"] - r["contribution_baseline"], reverse=True)
-
-    total_delta = sum(r["contribution_current"] - r["contribution_baseline"] for r in rows)
-    updated = now_msk().strftime("%d.%m %H:%M МСК")
+    updated = (now or now_msk()).strftime(_UPDATED_FMT)
 
     if not active_rows:
         return (
@@ -417,34 +590,23 @@ def format_alliance_weekly_message(rows: list, week_start: str) -> str:
             f"🕐 <i>Обновлено: {updated}</i>"
         )
 
-    medals = {1: "🥇", 2: "🥈", 3: "🥉"}
-    medal_lines = []
-    rest_lines  = []
+    lines = [f"🏰 <b>Вклад клуба в альянс</b> ({date_range})", ""]
 
-    for i, r in enumerate(active_rows, 1):
-        url   = r.get("profile_url", "")
+    for i, (delta, r) in enumerate(active_rows, 1):
+        url   = r["profile_url"] or ""
         nick  = r["nick"]
         base  = r["contribution_baseline"]
         curr  = r["contribution_current"]
-        delta = curr - base
         name  = f'<a href="{url}">{nick}</a>' if url else nick
-        line  = f"{medals.get(i, f'{i}.')} {name} — {base} → <b>{curr}</b> (+{delta})"
-
-        if i <= 3:
-            medal_lines.append(line)
-        else:
-            rest_lines.append(line)
-
-    body = "\n".join(medal_lines)
-    if rest_lines:
-        body += "\n\n" + "\n".join(rest_lines)
-
-    return (
-        f"🏰 <b>Вклад клуба в альянс</b> ({date_range})\n\n"
-        + body
-        + f"\n📈 Прирост за неделю: <b>+{total_delta}</b>"
-        + f"\n🕐 <i>Обновлено: {updated}</i>"
-    )
+        place = _MEDALS[i] if i <= 3 else f"{i}."
+        # Пустая строка отделяет призёров от остальных
+        if i == 4:
+            lines.append("")
+        lines.append(f"{place} {name} — {base} → <b>{curr}</b> (+{delta})")
+
+    lines.append(f"📈 Прирост за неделю: <b>+{total_delta}</b>")
+    lines.append(f"🕐 <i>Обновлено: {updated}</i>")
+    return "\n".join(lines)
 
 
 # ══════════════════════════════════════════════════════════════
@@ -454,12 +616,18 @@ def format_alliance_weekly_message(rows: list, week_start: str) -> str:
 
 async def send_or_update_alliance_pinned(
     bot: Bot,
-    rows: List[Dict],
+    rows: List[aiosqlite.Row],
     week_start: str,
+    now: Optional[datetime] = None,
 ):
-    chat_id   = REQUIRED_TG_GROUP_ID
-    thread_id = GROUP_ALLIANCE_TOPIC_ID
-    text      = format_alliance_weekly_message(rows, week_start)
+    # Часы читаются один раз: тот же момент идёт в текст и в БД
+    if now is None:
+        now = now_msk()
+    chat_id    = REQUIRED_TG_GROUP_ID
+    thread_id  = GROUP_ALLIANCE_TOPIC_ID
+    text       = format_alliance_weekly_message(rows, week_start, now)
+    text_hash  = compute_alliance_text_hash(text)
+    updated_at = ts_for_db(now)
 
     pinned_info = await get_pinned_alliance_message(chat_id)
 
@@ -467,6 +635,11 @@ async def send_or_update_alliance_pinned(
         logger.info(f"[Alliance] Смена недели → создаём новое сообщение")
         pinned_info = None
 
+    # Данные не менялись с последней отправки — не дёргаем Bot API
+    if pinned_info and pinned_info.get("text_hash") == text_hash:
+        logger.debug("[Alliance] Текст не изменился (хеш совпал), пропускаем")
+        return
+
     if pinned_info:
         try:
             await bot.edit_message_text(
@@ -477,7 +650,8 @@ async def send_or_update_alliance_pinned(
                 disable_web_page_preview=True,
             )
             await save_pinned_alliance_message(
-                chat_id, thread_id, pinned_info["message_id"], week_start
+                chat_id, thread_id, pinned_info["message_id"], week_start,
+                text_hash, updated_at,
             )
             logger.info("✅ Закреплённое сообщение альянса обновлено")
             return
@@ -501,21 +675,33 @@ async def send_or_update_alliance_pinned(
             message_thread_id=thread_id,
             disable_web_page_preview=True,
         )
-        try:
-            await bot.pin_chat_message(
-                chat_id=chat_id,
-                message_id=msg.message_id,
-                disable_notification=True,
-            )
-            logger.info("[Alliance] Сообщение закреплено")
-        except TelegramError as e:
-            logger.warning(
-                f"[Alliance] Не удалось закрепить: {e}\n"
-                "Убедись что бот — администратор с правом 'Закреплять сообщения'"
-            )
 
-        await save_pinned_alliance_message(chat_id, thread_id, msg.message_id, week_start)
-        logger.info("✅ Новое закреплённое сообщение альянса отправлено")
+        async def _pin():
+            try:
+                await bot.pin_chat_message(
+                    chat_id=chat_id,
+                    message_id=msg.message_id,
+                    disable_notification=True,
+                )
+                logger.info("[Alliance] Сообщение закреплено")
+            except TelegramError as e:
+                logger.warning(
+                    f"[Alliance] Не удалось закрепить: {e}\n"
+                    "Убедись что бот — администратор с правом 'Закреплять сообщения'"
+                )
+
+        # Закрепление и запись в БД не зависят друг от друга
+        _, saved = await asyncio.gather(
+            _pin(),
+            save_pinned_alliance_message(
+                chat_id, thread_id, msg.message_id, week_start,
+                text_hash, updated_at,
+            ),
+        )
+        logger.info(
+            f"✅ Новое закреплённое сообщение альянса отправлено "
+            f"(message_id={saved['message_id']}, неделя {saved['week_start']})"
+        )
 
     except TelegramError as e:
         logger.error(f"[Alliance] Ошибка отправки: {e}")
\ No newline at end of file
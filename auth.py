@@ -3,6 +3,8 @@
 from typing import Optional
 from urllib.parse import unquote
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 
 from config import BASE_URL, REQUEST_TIMEOUT
@@ -88,11 +90,28 @@ def _nav_headers(referer: Optional[str] = None, fetch_site: str = "none") -> dic
 
 def create_session(proxy_manager: Optional[ProxyManager] = None) -> RateLimitedSession:
     raw = requests.Session()
+    # Все запросы идут на один хост — держим keep-alive соединения в пуле,
+    # чтобы логин, буст и AJAX не делали повторный TCP/TLS-хендшейк.
+    # pool_maxsize=16 — с запасом на мониторы, которые ходят через сессию
+    # параллельно из executor-потоков, плюс до NICKNAME_WORKERS параллельных
+    # загрузок профилей (card_info_parser); новый фоновый опрос — учитывать здесь.
+    # Retry повторяет только идемпотентные запросы (GET/HEAD/...) при 502/503/504;
+    # raise_on_status=False — после исчерпания попыток вызывающий код
+    # получает обычный ответ и сам проверяет статус.
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    raw.mount("https://", adapter)
+    raw.mount("http://", adapter)
     if proxy_manager and proxy_manager.is_enabled():
         proxies = proxy_manager.get_proxies()
         if proxies:
             raw.proxies.update(proxies)
-    raw.headers.update({"User-Agent": USER_AGENT})
+    raw.headers.update({"User-Agent": USER_AGENT, "Connection": "keep-alive"})
     return RateLimitedSession(raw)
 
 
@@ -1,5 +1,6 @@
 """FSM бронирования (личные сообщения)."""
 
+import asyncio
 import logging
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import (
@@ -11,9 +12,9 @@ from telegram.ext import (
 
 from database import (
     create_booking,
-    get_bookings_for_schedule,
     add_booking_event,
-    BookingConflictError
+    BookingConflictError,
+    BookingSlotTakenError
 )
 from timezone_utils import (
     get_today_date,
@@ -31,6 +32,7 @@ from booking_validator import (
 from booking_utils import (
     get_verified_user,
     get_active_bookings_today_tomorrow,
+    get_busy_bookings_cached,
     format_active_bookings_text
 )
 
@@ -41,7 +43,6 @@ STEP_DATE = 1
 STEP_START_TIME = 2
 STEP_END_TIME = 3
 
-
 # ══════════════════════════════════════════════════════════════
 # HANDLERS
 # ══════════════════════════════════════════════════════════════
@@ -51,7 +52,12 @@ async def start_booking_flow(update: Update, context: ContextTypes.DEFAULT_TYPE)
     """Начало процесса бронирования."""
     user = update.effective_user
 
-    db_user = await get_verified_user(user.id)
+    # Два независимых запроса — параллельно; брони нужны только
+    # верифицированному пользователю, иначе просто отбрасываются
+    db_user, existing = await asyncio.gather(
+        get_verified_user(user.id),
+        get_active_bookings_today_tomorrow(user.id)
+    )
     if not db_user:
         await update.message.reply_text(
             "❌ Для бронирования нужно привязать аккаунт.\n"
@@ -59,8 +65,6 @@ async def start_booking_flow(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
         return ConversationHandler.END
 
-    # Проверка существующих броней
-    existing = await get_active_bookings_today_tomorrow(user.id)
     if existing:
         await update.message.reply_text(
             format_active_bookings_text(existing, for_group=False)
@@ -108,7 +112,7 @@ async def receive_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     context.user_data["booking_date"] = selected_date
 
-    busy_bookings = await get_bookings_for_schedule([selected_date])
+    busy_bookings = await get_busy_bookings_cached(context, selected_date)
     available_slots = get_available_start_slots(selected_date, busy_bookings)
 
     if not available_slots:
@@ -153,7 +157,7 @@ async def receive_start_time(update: Update, context: ContextTypes.DEFAULT_TYPE)
     context.user_data["booking_start_time"] = start_time
 
     selected_date = context.user_data["booking_date"]
-    busy_bookings = await get_bookings_for_schedule([selected_date])
+    busy_bookings = await get_busy_bookings_cached(context, selected_date)
     available_slots = get_available_end_slots(selected_date, start_time, busy_bookings)
 
     if not available_slots:
@@ -187,7 +191,7 @@ async def receive_end_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data.pop("booking_start_time", None)
 
         selected_date = context.user_data["booking_date"]
-        busy_bookings = await get_bookings_for_schedule([selected_date])
+        busy_bookings = await get_busy_bookings_cached(context, selected_date)
         available_slots = get_available_start_slots(selected_date, busy_bookings)
 
         keyboard = format_time_slots_keyboard(available_slots, per_row=4)
@@ -236,6 +240,13 @@ async def receive_end_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
             end_time=end_time,
             duration_hours=duration_hours
         )
+    except BookingSlotTakenError:
+        await update.message.reply_text(
+            "⚠️ Этот слот уже занят\n"
+            "Пожалуйста, выбери другое время.",
+            reply_markup=ReplyKeyboardRemove()
+        )
+        return ConversationHandler.END
     except BookingConflictError:
         await update.message.reply_text(
             "⚠️ У тебя уже есть бронь на этот день.\n"
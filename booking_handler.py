@@ -6,14 +6,15 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CallbackQueryHandler
 
 from database import get_booking, confirm_booking, add_booking_event
-from timezone_utils import ts_for_db, now_msk, format_date_ru, format_time_range
+from timezone_utils import now_for_db, format_date_ru, format_time_range
 from booking import start_booking_flow
 
 logger = logging.getLogger(__name__)
 
-# Regex для триггера бронирования
+# Regex для триггера бронирования: без захвата, общий префикс «брон»
+# вынесен — движку меньше откатов на каждом сообщении группы
 BOOKING_TRIGGER = re.compile(
-    r'\b(бронь|забронировать|бронировать)\b',
+    r'\b(?:забронировать|брон(?:ировать|ь))\b',
     re.IGNORECASE
 )
 
@@ -68,7 +69,7 @@ async def confirm_booking_callback(update: Update, context: ContextTypes.DEFAULT
         return
 
     # Подтверждаем бронь
-    confirmed_at = ts_for_db(now_msk())
+    confirmed_at = now_for_db()
     await confirm_booking(booking_id, confirmed_at)
     await add_booking_event(
         booking_id,
@@ -1,6 +1,10 @@
 """Планировщик задач для броней."""
 
+import asyncio
 import logging
+from datetime import datetime
+from typing import Optional
+from apscheduler.executors.asyncio import AsyncIOExecutor
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from telegram import Bot
 
@@ -9,28 +13,30 @@ from database import (
     get_bookings_needing_reminder,
     get_bookings_needing_cancellation,
     get_bookings_to_complete,
-    mark_remind_sent,
-    cancel_booking,
-    complete_booking,
-    add_booking_event
+    mark_remind_sent_bulk,
+    cancel_bookings_bulk,
+    complete_bookings_bulk,
+    mark_group_notified_bulk
 )
 from notifier import (
     send_booking_reminder,
     send_booking_cancelled_to_user,
     notify_group_booking_cancelled
 )
-from database import mark_group_notified
-from timezone_utils import now_msk, parse_booking_dt, minutes_until, ts_for_db
+from timezone_utils import now_msk, ts_for_db
 
 logger = logging.getLogger(__name__)
 
+# Сколько сообщений в Telegram планировщик отправляет одновременно
+NOTIFY_CONCURRENCY = 10
+
 
 # ══════════════════════════════════════════════════════════════
 # ЗАДАЧИ ПЛАНИРОВЩИКА
 # ══════════════════════════════════════════════════════════════
 
 
-async def check_upcoming_bookings(bot: Bot):
+async def check_upcoming_bookings(bot: Bot, now: Optional[datetime] = None):
     """
     Проверяет брони, которым нужно отправить напоминание за 5 минут.
     
@@ -40,31 +46,36 @@ async def check_upcoming_bookings(bot: Bot):
     - до начала осталось <= 5 минут
     """
     try:
-        bookings = await get_bookings_needing_reminder()
+        # Временной фильтр — в SQL по start_ts: до начала осталось от 0 до 5
+        # минут (с точностью до минуты, как считал minutes_until)
+        now = now or now_msk()
+        now_ts = int(now.timestamp())
+        bookings = await get_bookings_needing_reminder(
+            now_ts - 59,
+            now_ts + (BOOKING_CONFIRM_BEFORE_MINUTES + 1) * 60 - 1
+        )
         
-        for booking in bookings:
-            # Вычисляем время до начала
-            start_dt = parse_booking_dt(booking.date, booking.start_time)
-            minutes_left = minutes_until(start_dt)
-            
-            # Если до начала <= 5 минут, отправляем напоминание
-            if 0 <= minutes_left <= BOOKING_CONFIRM_BEFORE_MINUTES:
-                success = await send_booking_reminder(bot, booking)
-                
-                if success:
-                    await mark_remind_sent(booking.id)
-                    await add_booking_event(
-                        booking.id,
-                        "remind_sent",
-                        "system"
-                    )
-                    logger.info(f"✅ Напоминание отправлено для брони #{booking.id}")
+        # Напоминания независимы — отправляем параллельно (не более
+        # NOTIFY_CONCURRENCY запросов к Telegram одновременно)
+        sem = asyncio.Semaphore(NOTIFY_CONCURRENCY)
+        
+        async def remind(booking) -> bool:
+            async with sem:
+                return await send_booking_reminder(bot, booking)
+        
+        results = await asyncio.gather(*(remind(b) for b in bookings))
+        reminded = [b.id for b, ok in zip(bookings, results) if ok]
+        for booking_id in reminded:
+            logger.info(f"✅ Напоминание отправлено для брони #{booking_id}")
+        
+        # Отметки и события — одной транзакцией на весь тик
+        await mark_remind_sent_bulk(reminded, event_at=ts_for_db(now))
                     
     except Exception as e:
         logger.error(f"Ошибка в check_upcoming_bookings: {e}", exc_info=True)
 
 
-async def check_expired_bookings(bot: Bot):
+async def check_expired_bookings(bot: Bot, now: Optional[datetime] = None):
     """
     Проверяет брони, которые нужно отменить по таймауту.
     
@@ -74,42 +85,47 @@ async def check_expired_bookings(bot: Bot):
     - прошло >= 5 минут после начала
     """
     try:
-        bookings = await get_bookings_needing_cancellation()
+        # В SQL отбираются брони, с начала которых прошло >= 5 минут
+        now = now or now_msk()
+        now_ts = int(now.timestamp())
+        expired = await get_bookings_needing_cancellation(
+            now_ts - BOOKING_CONFIRM_GRACE_MINUTES * 60
+        )
         
-        for booking in bookings:
-            # Вычисляем время с начала
-            start_dt = parse_booking_dt(booking.date, booking.start_time)
-            minutes_since_start = -minutes_until(start_dt)  # отрицательное значение = прошло времени
-            
-            # Если прошло >= 5 минут после начала, отменяем
-            if minutes_since_start >= BOOKING_CONFIRM_GRACE_MINUTES:
-                # Отменяем бронь
-                await cancel_booking(
-                    booking.id,
-                    cancelled_by="system",
-                    cancel_reason="Не подтверждена в течение 5 минут после начала"
-                )
-                
-                await add_booking_event(
-                    booking.id,
-                    "cancelled_timeout",
-                    "system"
+        if not expired:
+            return
+        
+        # Отменяем все просроченные брони разом; отметки времени — из снимка тика
+        expired_ids = [b.id for b in expired]
+        cancelled_at = ts_for_db(now)
+        await cancel_bookings_bulk(
+            expired_ids,
+            cancelled_by="system",
+            cancel_reason="Не подтверждена в течение 5 минут после начала",
+            cancelled_at=cancelled_at,
+            event_type="cancelled_timeout"
+        )
+        
+        sem = asyncio.Semaphore(NOTIFY_CONCURRENCY)
+        
+        async def notify(booking):
+            async with sem:
+                # Пользователь и группа уведомляются одновременно
+                await asyncio.gather(
+                    send_booking_cancelled_to_user(bot, booking),
+                    notify_group_booking_cancelled(bot, booking, "system")
                 )
-                
-                # Уведомляем пользователя
-                await send_booking_cancelled_to_user(bot, booking)
-                
-                # Уведомляем группу
-                await notify_group_booking_cancelled(bot, booking, "system")
-                await mark_group_notified(booking.id)
-                
-                logger.info(f"❌ Бронь #{booking.id} отменена по таймауту")
+            logger.info(f"❌ Бронь #{booking.id} отменена по таймауту")
+        
+        await asyncio.gather(*(notify(b) for b in expired))
+        
+        await mark_group_notified_bulk(expired_ids)
                 
     except Exception as e:
         logger.error(f"Ошибка в check_expired_bookings: {e}", exc_info=True)
 
 
-async def complete_finished_bookings(bot: Bot):
+async def complete_finished_bookings(bot: Bot, now: Optional[datetime] = None):
     """
     Завершает подтверждённые брони, время которых истекло.
     
@@ -120,29 +136,34 @@ async def complete_finished_bookings(bot: Bot):
     Уведомления не отправляются.
     """
     try:
-        bookings = await get_bookings_to_complete()
+        # В SQL отбираются брони, время окончания которых наступило
+        now = now or now_msk()
+        finished = await get_bookings_to_complete(int(now.timestamp()))
+        if not finished:
+            return
         
-        for booking in bookings:
-            # Проверяем, истекло ли время
-            end_dt = parse_booking_dt(booking.date, booking.end_time)
-            
-            if now_msk() >= end_dt:
-                # Завершаем бронь
-                completed_at = ts_for_db(now_msk())
-                await complete_booking(booking.id, completed_at)
-                
-                await add_booking_event(
-                    booking.id,
-                    "completed",
-                    "system"
-                )
-                
-                logger.info(f"✅ Бронь #{booking.id} завершена")
+        # Завершаем все истёкшие брони одним UPDATE, события — в той же транзакции
+        completed_at = ts_for_db(now)
+        await complete_bookings_bulk(finished, completed_at, event_type="completed")
+        
+        for booking_id in finished:
+            logger.info(f"✅ Бронь #{booking_id} завершена")
                 
     except Exception as e:
         logger.error(f"Ошибка в complete_finished_bookings: {e}", exc_info=True)
 
 
+async def booking_tick(bot: Bot):
+    """
+    Один минутный тик планировщика: напоминания, отмены по таймауту
+    и завершение броней — по общему снимку времени.
+    """
+    now = now_msk()
+    await check_upcoming_bookings(bot, now)
+    await check_expired_bookings(bot, now)
+    await complete_finished_bookings(bot, now)
+
+
 # ══════════════════════════════════════════════════════════════
 # ИНИЦИАЛИЗАЦИЯ ПЛАНИРОВЩИКА
 # ══════════════════════════════════════════════════════════════
@@ -158,33 +179,26 @@ def init_scheduler(bot: Bot) -> AsyncIOScheduler:
     Returns:
         запущенный планировщик
     """
-    scheduler = AsyncIOScheduler(timezone=TZ)
-    
-    # Проверка напоминаний (каждую минуту)
-    scheduler.add_job(
-        check_upcoming_bookings,
-        'interval',
-        minutes=1,
-        args=[bot],
-        id='check_reminders'
-    )
-    
-    # Проверка истёкших броней (каждую минуту)
-    scheduler.add_job(
-        check_expired_bookings,
-        'interval',
-        minutes=1,
-        args=[bot],
-        id='check_expired'
+    # Корутины выполняются прямо в event loop бота (без запасного
+    # ThreadPoolExecutor). Для всех задач: пропущенные запуски схлопываются
+    # в один, параллельно одна задача не идёт, опоздание до 5 минут допустимо.
+    scheduler = AsyncIOScheduler(
+        timezone=TZ,
+        executors={"default": AsyncIOExecutor()},
+        job_defaults={
+            "coalesce": True,
+            "max_instances": 1,
+            "misfire_grace_time": 300,
+        },
     )
     
-    # Завершение броней (каждую минуту)
+    # Все проверки броней — одной задачей раз в минуту
     scheduler.add_job(
-        complete_finished_bookings,
+        booking_tick,
         'interval',
         minutes=1,
         args=[bot],
-        id='complete_bookings'
+        id='booking_tick'
     )
     
     scheduler.start()
@@ -5,13 +5,24 @@
 """
 
 import logging
+import time
 from typing import Optional, Tuple, List
 
-from database import get_user, get_user_active_bookings, User, Booking
+from database import (
+    get_user,
+    get_user_active_bookings,
+    get_bookings_for_date,
+    User,
+    Booking
+)
 from timezone_utils import get_today_date, get_tomorrow_date, format_date_ru
 
 logger = logging.getLogger(__name__)
 
+# Сколько секунд занятость даты из user_data считается свежей.
+# Финальная проверка validate_booking_slot всё равно идёт по БД.
+BUSY_CACHE_TTL = 30
+
 
 async def get_verified_user(tg_id: int) -> Optional[User]:
     """
@@ -44,6 +55,27 @@ async def get_active_bookings_today_tomorrow(tg_id: int) -> List[Booking]:
     return await get_user_active_bookings(tg_id, [today, tomorrow])
 
 
+async def get_busy_bookings_cached(context, date: str) -> List[Booking]:
+    """
+    Брони на дату с кэшем в context.user_data — шаги выбора времени
+    (FSM в личке и inline-кнопки в группе) не ходят в БД повторно.
+
+    Args:
+        context: контекст PTB (нужен только user_data)
+        date: дата в формате YYYY-MM-DD
+
+    Returns:
+        список активных броней на дату
+    """
+    cached = context.user_data.get("busy_bookings")
+    now = time.monotonic()
+    if cached and cached[0] == date and now - cached[1] < BUSY_CACHE_TTL:
+        return cached[2]
+    busy_bookings = await get_bookings_for_date(date)
+    context.user_data["busy_bookings"] = (date, now, busy_bookings)
+    return busy_bookings
+
+
 def format_active_bookings_text(bookings: List[Booking], for_group: bool = False) -> str:
     """
     Форматирует текст сообщения об активных бронях.
@@ -55,18 +87,17 @@ def format_active_bookings_text(bookings: List[Booking], for_group: bool = False
     Returns:
         текст сообщения
     """
-    text = "📋 У тебя уже есть активные брони:\n\n"
-    for b in bookings:
-        status_emoji = "🟢" if b.status == "confirmed" else "🟡"
-        text += (
-            f"{status_emoji} {format_date_ru(b.date)} | "
-            f"🕐 {b.start_time} — {b.end_time} МСК\n"
-            f"Для отмены брони используй команду: /cancelbooking {b.id}\n"
-        )
+    parts = ["📋 У тебя уже есть активные брони:\n\n"]
+    parts.extend(
+        f"{'🟢' if b.status == 'confirmed' else '🟡'} {format_date_ru(b.date)} | "
+        f"🕐 {b.start_time} — {b.end_time} МСК\n"
+        f"Для отмены брони используй команду: /cancelbooking {b.id}\n"
+        for b in bookings
+    )
 
     if for_group:
-        text += "\n⚠️ Одна дата — одна бронь."
+        parts.append("\n⚠️ Одна дата — одна бронь.")
     else:
-        text += "\nОдна дата — одна бронь. Хочешь отменить? → /cancelbooking"
+        parts.append("\nОдна дата — одна бронь. Хочешь отменить? → /cancelbooking")
 
-    return text
\ No newline at end of file
+    return "".join(parts)
\ No newline at end of file
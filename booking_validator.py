@@ -1,8 +1,9 @@
 """Валидация и расчёт слотов бронирования."""
 
+import itertools
 import logging
 import math
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import List, Tuple
 
 from config import BOOKING_MAX_HOURS
@@ -14,6 +15,13 @@ logger = logging.getLogger(__name__)
 # Максимум слотов в inline-клавиатуре (ограничение UX)
 MAX_INLINE_SLOTS = 20
 
+# Сетка слотов дня (шаг 30 минут): индекс = минуты // 30.
+# Строки "HH:MM" строятся один раз при импорте, а не на каждый запрос.
+SLOT_STEP_MINUTES = 30
+_SLOTS_OF_DAY = tuple(
+    f"{m // 60:02d}:{m % 60:02d}" for m in range(0, 24 * 60, SLOT_STEP_MINUTES)
+)
+
 
 # ══════════════════════════════════════════════════════════════
 # РАСЧЁТ СЛОТОВ
@@ -35,23 +43,30 @@ def get_next_half_hour(now: datetime) -> int:
     return math.ceil((minutes + 1) / 30) * 30
 
 
-def _slot_overlaps_bookings(slot_time: str, bookings: List[Booking]) -> bool:
-    """
-    Проверяет, попадает ли слот внутрь одной из существующих броней.
+def _to_minutes(time_str: str) -> int:
+    """"HH:MM" → минуты от полуночи."""
+    return int(time_str[:2]) * 60 + int(time_str[3:5])
 
-    Начинать бронь нельзя, если slot_time >= start AND slot_time < end.
+
+def _busy_start_slots(bookings: List[Booking]) -> frozenset:
+    """
+    Слоты сетки, с которых начинать бронь нельзя:
+    slot попадает внутрь брони, если start <= slot < end.
 
     Args:
-        slot_time: время в формате HH:MM
         bookings: активные брони на эту дату
 
     Returns:
-        True если слот занят
+        frozenset строк "HH:MM"
     """
-    for b in bookings:
-        if b.start_time <= slot_time < b.end_time:
-            return True
-    return False
+    return frozenset(
+        _SLOTS_OF_DAY[i]
+        for b in bookings
+        for i in range(
+            -(-_to_minutes(b.start_time) // SLOT_STEP_MINUTES),
+            min(-(-_to_minutes(b.end_time) // SLOT_STEP_MINUTES), len(_SLOTS_OF_DAY))
+        )
+    )
 
 
 def get_available_start_slots(
@@ -80,15 +95,12 @@ def get_available_start_slots(
     else:
         start_min = 0
 
-    slots = []
-    for m in range(start_min, 24 * 60, 30):
-        h, mn = divmod(m, 60)
-        slot = f"{h:02d}:{mn:02d}"
-
-        if not _slot_overlaps_bookings(slot, busy_bookings):
-            slots.append(slot)
-
-    return slots
+    # Занятые слоты собираются в frozenset один раз — дальше O(1) на слот
+    busy = _busy_start_slots(busy_bookings)
+    return [
+        slot for slot in _SLOTS_OF_DAY[start_min // SLOT_STEP_MINUTES:]
+        if slot not in busy
+    ]
 
 
 def get_available_end_slots(
@@ -112,51 +124,33 @@ def get_available_end_slots(
     Returns:
         список времён в формате HH:MM
     """
-    start_dt = parse_booking_dt(date, start_time)
-    max_end = start_dt + timedelta(hours=BOOKING_MAX_HOURS)
-
-    slots = []
-    for delta in range(30, BOOKING_MAX_HOURS * 60 + 1, 30):
-        candidate_dt = start_dt + timedelta(minutes=delta)
-
-        # Проверяем максимальную длительность
-        if candidate_dt > max_end:
-            break
-
-        candidate_time = candidate_dt.strftime("%H:%M")
+    # Всё считаем в минутах от полуночи. Кандидат c конфликтует с бронью
+    # [b_start, b_end), если c > b_start и start < b_end. Значит, предел
+    # окончания — самое раннее начало среди броней, которые ещё не
+    # закончились к start_min; он находится одним проходом по броням.
+    start_min = _to_minutes(start_time)
+    limit = min(
+        (_to_minutes(b.start_time) for b in busy_bookings if _to_minutes(b.end_time) > start_min),
+        default=24 * 60
+    )
+    # Бронь не может переходить через полночь (validate_booking_slot
+    # отклонит end_time <= start_time)
+    limit = min(limit, 24 * 60 - 1, start_min + BOOKING_MAX_HOURS * 60)
 
-        # Проверяем конфликт с существующими бронями
-        if has_conflict_with_bookings(start_time, candidate_time, busy_bookings):
-            break  # Останавливаемся на первом конфликте
+    if start_min % SLOT_STEP_MINUTES == 0:
+        # Начало на сетке — окончания берём срезом готовой таблицы слотов
+        return list(_SLOTS_OF_DAY[
+            start_min // SLOT_STEP_MINUTES + 1:limit // SLOT_STEP_MINUTES + 1
+        ])
 
-        slots.append(candidate_time)
+    slots = []
+    for candidate_min in range(start_min + SLOT_STEP_MINUTES, limit + 1, SLOT_STEP_MINUTES):
+        h, mn = divmod(candidate_min, 60)
+        slots.append(f"{h:02d}:{mn:02d}")
 
     return slots
 
 
-def has_conflict_with_bookings(
-    start_time: str,
-    end_time: str,
-    bookings: List[Booking]
-) -> bool:
-    """
-    Проверяет конфликт с существующими бронями.
-
-    Args:
-        start_time: время начала новой брони
-        end_time: время окончания новой брони
-        bookings: список активных броней
-
-    Returns:
-        True если есть конфликт
-    """
-    for booking in bookings:
-        # Конфликт если интервалы пересекаются
-        if not (end_time <= booking.start_time or start_time >= booking.end_time):
-            return True
-    return False
-
-
 # ══════════════════════════════════════════════════════════════
 # ВАЛИДАЦИЯ
 # ══════════════════════════════════════════════════════════════
@@ -214,8 +208,4 @@ def format_time_slots_keyboard(slots: List[str], per_row: int = 4) -> List[List[
     Returns:
         список рядов кнопок
     """
-    keyboard = []
-    for i in range(0, len(slots), per_row):
-        row = slots[i:i + per_row]
-        keyboard.append(row)
-    return keyboard
\ No newline at end of file
+    return [list(row) for row in itertools.batched(slots, per_row)]
\ No newline at end of file
@@ -5,17 +5,34 @@
 """
 
 import logging
-from typing import Optional, List, Tuple
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Tuple, Dict
 
+import lxml.html
 import requests
-from bs4 import BeautifulSoup
+from lxml.etree import XPath
 
 from config import BASE_URL, REQUEST_TIMEOUT
+from html_utils import xp_class
 
 logger = logging.getLogger(__name__)
 
-MAX_RETRIES = 2
-RETRY_DELAY = 3
+# Сколько профилей владельцев грузится одновременно
+# (keep-alive соединения для них заложены в пул адаптера — см. auth.create_session)
+NICKNAME_WORKERS = 5
+
+# Название карты не меняется — держим в памяти, чтобы повторные запросы
+# (рестарт мониторинга, повторная смена на ту же карту) не качали страницу
+CARD_NAME_CACHE_TTL = 300
+_CARD_NAME_CACHE_MAX = 512
+_card_names: Dict[int, Tuple[float, str]] = {}
+
+
+# Со страницы нужен один узел — XPath компилируется один раз при импорте
+_XP_CARD_NAME     = XPath("//" + xp_class("div", "card-show") + "/@data-name")
+_XP_MOBILE_NICK   = XPath("//" + xp_class("div", "mobile-profile__name") + "/@data-name")
+_XP_PROFILE_NAME  = XPath("//" + xp_class("div", "profile__name"))
 
 
 def get_card_name(session: requests.Session, card_id: int) -> str:
@@ -31,42 +48,53 @@ def get_card_name(session: requests.Session, card_id: int) -> str:
     Returns:
         Название карты или запасное значение
     """
+    cached = _card_names.get(card_id)
+    if cached is not None and time.monotonic() - cached[0] < CARD_NAME_CACHE_TTL:
+        return cached[1]
+
     url = f"{BASE_URL}/cards/{card_id}/users"
 
-    for attempt in range(MAX_RETRIES):
-        try:
-            response = session.get(url, timeout=REQUEST_TIMEOUT)
-
-            if response.status_code != 200:
-                logger.warning(
-                    f"Ошибка загрузки страницы карты {card_id}: "
-                    f"{response.status_code} (попытка {attempt + 1})"
-                )
-                if attempt < MAX_RETRIES - 1:
-                    import time; time.sleep(RETRY_DELAY)
-                continue
-
-            soup = BeautifulSoup(response.text, "html.parser")
-
-            # Ищем <div class="card-show" data-name="...">
-            card_div = soup.find("div", class_="card-show")
-            if card_div:
-                name = card_div.get("data-name", "").strip()
-                if name:
-                    logger.debug(f"Название карты {card_id}: {name}")
-                    return name
-
-            logger.warning(f"Не удалось найти data-name для карты {card_id}")
+    # Повторы при обрывах и 502/503/504 делает адаптер сессии (auth.create_session)
+    try:
+        response = session.get(url, timeout=REQUEST_TIMEOUT)
+
+        if response.status_code != 200:
+            logger.warning(
+                f"Ошибка загрузки страницы карты {card_id}: {response.status_code}"
+            )
             return f"Карта #{card_id}"
 
-        except Exception as e:
-            logger.error(f"Ошибка при получении названия карты {card_id}: {e}")
-            if attempt < MAX_RETRIES - 1:
-                import time; time.sleep(RETRY_DELAY)
+        tree = lxml.html.fromstring(response.content)
+
+        # Ищем <div class="card-show" data-name="...">
+        names = _XP_CARD_NAME(tree)
+        if names:
+            name = names[0].strip()
+            if name:
+                logger.debug(f"Название карты {card_id}: {name}")
+                _remember_card_name(card_id, name)
+                return name
+
+        logger.warning(f"Не удалось найти data-name для карты {card_id}")
+
+    except Exception as e:
+        logger.error(f"Ошибка при получении названия карты {card_id}: {e}")
 
     return f"Карта #{card_id}"
 
 
+def _remember_card_name(card_id: int, name: str):
+    """Кладёт название в кэш (запасные «Карта #id» не кэшируются)."""
+    if len(_card_names) >= _CARD_NAME_CACHE_MAX:
+        _card_names.clear()
+    _card_names[card_id] = (time.monotonic(), name)
+
+
+def clear_card_name_cache():
+    """Сбрасывает кэш названий карт."""
+    _card_names.clear()
+
+
 def get_user_nickname(session: requests.Session, user_id: int) -> str:
     """
     Получает ник пользователя со страницы /users/{user_id}.
@@ -82,43 +110,37 @@ def get_user_nickname(session: requests.Session, user_id: int) -> str:
     """
     url = f"{BASE_URL}/users/{user_id}"
 
-    for attempt in range(MAX_RETRIES):
-        try:
-            response = session.get(url, timeout=REQUEST_TIMEOUT)
-
-            if response.status_code != 200:
-                logger.warning(
-                    f"Ошибка загрузки профиля {user_id}: "
-                    f"{response.status_code} (попытка {attempt + 1})"
-                )
-                if attempt < MAX_RETRIES - 1:
-                    import time; time.sleep(RETRY_DELAY)
-                continue
-
-            soup = BeautifulSoup(response.text, "html.parser")
-
-            # Мобильный профиль: <div class="mobile-profile__name" data-name="...">
-            name_div = soup.find("div", class_="mobile-profile__name")
-            if name_div:
-                nick = name_div.get("data-name", "").strip()
-                if nick:
-                    logger.debug(f"Ник пользователя {user_id}: {nick}")
-                    return nick
-
-            # Запасной вариант: десктопный профиль
-            profile_div = soup.find("div", class_="profile__name")
-            if profile_div:
-                nick = profile_div.get_text(strip=True)
-                if nick:
-                    return nick
-
-            logger.warning(f"Не удалось найти ник пользователя {user_id}")
+    # Повторы при обрывах и 502/503/504 делает адаптер сессии (auth.create_session)
+    try:
+        response = session.get(url, timeout=REQUEST_TIMEOUT)
+
+        if response.status_code != 200:
+            logger.warning(
+                f"Ошибка загрузки профиля {user_id}: {response.status_code}"
+            )
             return f"User#{user_id}"
 
-        except Exception as e:
-            logger.error(f"Ошибка при получении ника пользователя {user_id}: {e}")
-            if attempt < MAX_RETRIES - 1:
-                import time; time.sleep(RETRY_DELAY)
+        tree = lxml.html.fromstring(response.content)
+
+        # Мобильный профиль: <div class="mobile-profile__name" data-name="...">
+        nicks = _XP_MOBILE_NICK(tree)
+        if nicks:
+            nick = nicks[0].strip()
+            if nick:
+                logger.debug(f"Ник пользователя {user_id}: {nick}")
+                return nick
+
+        # Запасной вариант: десктопный профиль
+        profile_divs = _XP_PROFILE_NAME(tree)
+        if profile_divs:
+            nick = "".join(t.strip() for t in profile_divs[0].itertext())
+            if nick:
+                return nick
+
+        logger.warning(f"Не удалось найти ник пользователя {user_id}")
+
+    except Exception as e:
+        logger.error(f"Ошибка при получении ника пользователя {user_id}: {e}")
 
     return f"User#{user_id}"
 
@@ -139,12 +161,15 @@ def get_owners_nicknames(
     Returns:
         список (user_id, nickname)
     """
-    result = []
     limited_ids = owner_ids[:max_owners]
-
-    for user_id in limited_ids:
-        nick = get_user_nickname(session, user_id)
-        result.append((user_id, nick))
+    if not limited_ids:
+        return []
+
+    # Профили независимы — ждём ответы параллельно. Частоту старта запросов
+    # по-прежнему ограничивает RateLimitedSession; map сохраняет порядок.
+    with ThreadPoolExecutor(max_workers=min(NICKNAME_WORKERS, len(limited_ids))) as ex:
+        nicks = ex.map(lambda user_id: get_user_nickname(session, user_id), limited_ids)
+        result = list(zip(limited_ids, nicks))
 
     if len(owner_ids) > max_owners:
         logger.info(
@@ -1,15 +1,123 @@
 """Парсер страницы клуба для проверки членства."""
 
 import logging
-import re
-from typing import Optional, Tuple
-from bs4 import BeautifulSoup
+import threading
+import time
+from typing import Optional, Tuple, Dict, Iterable
+import lxml.html
 import requests
+from lxml.etree import XPath
 
-from config import BASE_URL, CLUB_PAGE_PATH
+from config import BASE_URL, CLUB_PAGE_PATH, REQUEST_TIMEOUT
+from html_utils import USER_ID_RE, xp_class
 
 logger = logging.getLogger(__name__)
 
+# Разобранная страница клуба: (время загрузки, {mangabuff_id: ник}).
+# Все проверки в пределах MEMBERSHIP_CACHE_TTL делят одну загрузку.
+# «Не найден» по закэшированной странице перепроверяется по свежей —
+# пользователь мог только что вступить в клуб.
+MEMBERSHIP_CACHE_TTL = 60
+_club_members: Optional[Tuple[float, Dict[int, str]]] = None
+_club_lock = threading.Lock()
+
+
+# CSS-селекторы участников клуба в виде XPath (компилируются один раз)
+_XP_MEMBERS     = XPath("//" + xp_class("*", "club__member"))
+_XP_MEMBER_LINK = XPath(
+    ".//a[contains(concat(' ', normalize-space(@class), ' '), ' club__member-image ')"
+    " or contains(@href, '/users/')]"
+)
+_XP_MEMBER_NICK = XPath(".//" + xp_class("*", "club__member-name"))
+
+
+def _parse_club_members(html: bytes) -> Dict[int, str]:
+    """Один проход по странице клуба: {mangabuff_id: ник} всех участников."""
+    members: Dict[int, str] = {}
+    for member in _XP_MEMBERS(lxml.html.fromstring(html)):
+        links = _XP_MEMBER_LINK(member)
+        if not links:
+            continue
+        match = USER_ID_RE.search(links[0].get("href", ""))
+        if not match:
+            continue
+        user_id = int(match.group(1))
+        if user_id in members:
+            continue
+        nick_elems = _XP_MEMBER_NICK(member)
+        members[user_id] = "".join(t.strip() for t in nick_elems[0].itertext()) if nick_elems else ""
+    return members
+
+
+def _load_club_members(
+    session: requests.Session,
+    max_age: float = MEMBERSHIP_CACHE_TTL
+) -> Optional[Tuple[float, Dict[int, str]]]:
+    """
+    Возвращает (время загрузки, участники) — из кэша, если он моложе max_age,
+    иначе скачивает и разбирает страницу клуба. Параллельные вызовы
+    из executor-потоков ждут одну загрузку под локом — поэтому запрос
+    ограничен REQUEST_TIMEOUT: зависший ответ не держит лок бесконечно.
+    """
+    global _club_members
+    with _club_lock:
+        if _club_members is not None and time.monotonic() - _club_members[0] < max_age:
+            return _club_members
+
+        url = f"{BASE_URL}{CLUB_PAGE_PATH}"
+        response = session.get(url, timeout=REQUEST_TIMEOUT)
+
+        if response.status_code != 200:
+            logger.error(f"Ошибка загрузки страницы клуба: {response.status_code}")
+            return None
+
+        _club_members = (time.monotonic(), _parse_club_members(response.content))
+        return _club_members
+
+
+def check_club_membership_many(
+    session: requests.Session,
+    mangabuff_ids: Iterable[int]
+) -> Dict[int, Tuple[bool, str]]:
+    """
+    Проверяет членство сразу нескольких пользователей по одной загрузке
+    страницы клуба.
+
+    Returns:
+        {mangabuff_id: (is_member, nickname)}
+    """
+    ids = list(mangabuff_ids)
+    try:
+        requested_at = time.monotonic()
+        loaded = _load_club_members(session)
+        if loaded is None:
+            return {i: (False, "") for i in ids}
+
+        # Кого нет на закэшированной странице — проверяем по свежей
+        loaded_at, members = loaded
+        if loaded_at < requested_at and any(i not in members for i in ids):
+            loaded = _load_club_members(session, max_age=0)
+            if loaded is not None:
+                members = loaded[1]
+
+        result = {}
+        for mangabuff_id in ids:
+            nick = members.get(mangabuff_id)
+            if nick is None:
+                logger.info(f"❌ Пользователь {mangabuff_id} не найден в клубе")
+                result[mangabuff_id] = (False, "")
+            else:
+                if nick:
+                    logger.info(f"✅ Пользователь {mangabuff_id} найден в клубе: {nick}")
+                else:
+                    logger.info(f"✅ Пользователь {mangabuff_id} найден в клубе")
+                result[mangabuff_id] = (True, nick)
+        return result
+
+    except Exception as e:
+        logger.error(f"Ошибка проверки членства в клубе: {e}", exc_info=True)
+        return {i: (False, "") for i in ids}
+
 
 def check_club_membership(
     session: requests.Session,
@@ -17,48 +125,12 @@ def check_club_membership(
 ) -> Tuple[bool, str]:
     """
     Проверяет членство в клубе на сайте.
-    
+
     Args:
         session: авторизованная сессия
         mangabuff_id: ID пользователя на MangaBuff
-    
+
     Returns:
         (is_member, nickname) - состоит ли в клубе и его ник
     """
-    try:
-        url = f"{BASE_URL}{CLUB_PAGE_PATH}"
-        response = session.get(url)
-        
-        if response.status_code != 200:
-            logger.error(f"Ошибка загрузки страницы клуба: {response.status_code}")
-            return False, ""
-        
-        soup = BeautifulSoup(response.text, "html.parser")
-        
-        # Ищем всех участников клуба (включая скрытые элементы)
-        members = soup.select(".club__member")
-        
-        for member in members:
-            # Ищем ссылку на профиль
-            link = member.select_one("a.club__member-image, a[href*='/users/']")
-            if link:
-                href = link.get("href", "")
-                match = re.search(r'/users/(\d+)', href)
-                
-                if match and int(match.group(1)) == mangabuff_id:
-                    # Нашли пользователя, извлекаем ник
-                    nick_elem = member.select_one("a.club__member-name, .club__member-name")
-                    if nick_elem:
-                        nick = nick_elem.get_text(strip=True)
-                        logger.info(f"✅ Пользователь {mangabuff_id} найден в клубе: {nick}")
-                        return True, nick
-                    else:
-                        logger.info(f"✅ Пользователь {mangabuff_id} найден в клубе")
-                        return True, ""
-        
-        logger.info(f"❌ Пользователь {mangabuff_id} не найден в клубе")
-        return False, ""
-        
-    except Exception as e:
-        logger.error(f"Ошибка проверки членства в клубе: {e}", exc_info=True)
-        return False, ""
+    return check_club_membership_many(session, [mangabuff_id])[mangabuff_id]
@@ -1,8 +1,8 @@
 """Конфигурация проекта."""
 
 import os
-import pytz
 from pathlib import Path
+from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
 
 # Загружаем .env из директории самого config.py
@@ -70,7 +70,7 @@ GROUP_ALLIANCE_TOPIC_ID = int(os.getenv("GROUP_ALLIANCE_TOPIC_ID", "128570"))
 # ══════════════════════════════════════════════════════════════
 
 TIMEZONE = os.getenv("TIMEZONE", "Europe/Moscow")
-TZ = pytz.timezone(TIMEZONE)
+TZ = ZoneInfo(TIMEZONE)
 
 # ══════════════════════════════════════════════════════════════
 # БРОНИРОВАНИЕ
@@ -1,19 +1,71 @@
 """Модуль работы с базой данных."""
 
+import asyncio
 import logging
 import json
-from typing import Optional, List, Dict, Any
-from dataclasses import dataclass
+import os
+import struct
+import time
+from typing import Optional, List, Dict, Any, Tuple
+from collections import namedtuple
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, fields
 from datetime import datetime
 import aiosqlite
 from aiosqlite import IntegrityError
 
-from timezone_utils import ts_for_db, now_msk
+from timezone_utils import now_for_db, parse_booking_dt
 
 logger = logging.getLogger(__name__)
 
+# JSON-параметры запросов (списки для json_each) и миграция старого
+# формата club_owners: orjson, если установлен, иначе stdlib json
+try:
+    import orjson
+
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+    _json_loads = orjson.loads
+except ImportError:
+    _json_dumps = json.dumps
+    _json_loads = json.loads
+
 DB_PATH = "bot_data.db"
 
+# club_owners хранится BLOB-ом: подряд упакованные little-endian int64 —
+# 8 байт на ID и чтение без разбора текста
+_OWNER_ID = struct.Struct("<q")
+
+# WAL: читатели не блокируют запись; synchronous=NORMAL в WAL безопасен
+# для целостности. Кэш страниц 64 МБ и mmap 256 МБ живут, пока живёт
+# соединение — поэтому оно одно на процесс, а не новое на каждый запрос.
+# page_size=8192 действует только на новый файл БД и только до включения
+# WAL, поэтому идёт первым; у существующей базы размер страницы не меняется
+_PRAGMAS = """
+    PRAGMA page_size=8192;
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-65536;
+    PRAGMA mmap_size=268435456;
+"""
+# Для read-only соединений пула: режим журнала задаёт пишущее соединение
+_READ_PRAGMAS = """
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-16000;
+    PRAGMA mmap_size=268435456;
+"""
+
+# Соединений только для чтения: параллельные SELECT-ы хендлеров
+READ_POOL_SIZE = min(4, os.cpu_count() or 1)
+
+# Общее соединение модуля: открывается лениво один раз на процесс
+_DB: Optional[aiosqlite.Connection] = None
+_DB_LOCK = asyncio.Lock()
+# Сериализует пишущие транзакции на общем соединении
+_WRITE_LOCK = asyncio.Lock()
+
 
 # ══════════════════════════════════════════════════════════════
 # DATACLASSES
@@ -34,9 +86,12 @@ class ClubCard:
     is_current: int
 
 
-@dataclass
+@dataclass(frozen=True)
 class User:
-    """Пользователь бота."""
+    """
+    Пользователь бота. Неизменяемый: get_user отдаёт один и тот же
+    объект из кэша всем вызывающим.
+    """
     id: int
     tg_id: int
     tg_username: Optional[str]
@@ -69,6 +124,36 @@ class Booking:
     cancel_reason: Optional[str]
     remind_sent: int
     group_notified: int
+    start_ts: Optional[int] = None
+    end_ts: Optional[int] = None
+
+
+def _columns_of(cls) -> str:
+    """
+    Список колонок в порядке полей датакласса: строка выборки
+    распаковывается в конструктор позиционно, без dict(row) и **kwargs.
+    """
+    return ", ".join(f.name for f in fields(cls))
+
+
+# Тексты запросов собираются один раз при импорте (модульные _SQL_*):
+# одна и та же строка при каждом вызове попадает в кэш подготовленных
+# запросов sqlite3 (cached_statements, на каждом соединении) и не парсится заново
+_CLUB_CARD_COLUMNS = _columns_of(ClubCard)
+_USER_COLUMNS = _columns_of(User)
+_BOOKING_COLUMNS = _columns_of(Booking)
+
+
+# Облегчённая бронь для планировщика: только поля, которые читают
+# напоминания и уведомления об отмене, без гидрации всей строки в Booking
+BookingTick = namedtuple(
+    "BookingTick",
+    "id tg_id mangabuff_nick date start_time end_time cancelled_by group_notified"
+)
+
+_BOOKING_TICK_COLUMNS = (
+    "id, tg_id, mangabuff_nick, date, start_time, end_time, cancelled_by, group_notified"
+)
 
 
 # ══════════════════════════════════════════════════════════════
@@ -81,14 +166,94 @@ class BookingConflictError(Exception):
     pass
 
 
+class BookingSlotTakenError(Exception):
+    """Слот пересекается с чужой активной бронью."""
+    pass
+
+
 # ══════════════════════════════════════════════════════════════
 # ИНИЦИАЛИЗАЦИЯ БД
 # ══════════════════════════════════════════════════════════════
 
 
+async def _get_db() -> aiosqlite.Connection:
+    """Возвращает общее соединение, при первом вызове открывает его."""
+    global _DB
+    if _DB is None:
+        async with _DB_LOCK:
+            if _DB is None:
+                db = await aiosqlite.connect(DB_PATH)
+                db.row_factory = aiosqlite.Row
+                await db.executescript(_PRAGMAS)
+                _DB = db
+    return _DB
+
+
+class _ReadPool:
+    """
+    Пул read-only соединений. У каждого соединения aiosqlite свой поток,
+    поэтому чтения из разных хендлеров выполняются параллельно, а не в
+    очереди за записью на общем соединении; WAL позволяет им не ждать
+    пишущую транзакцию. Записи по-прежнему идут через _get_db().
+    """
+
+    def __init__(self, size: int):
+        self._size = size
+        self._queue: Optional[asyncio.Queue] = None
+        self._conns: List[aiosqlite.Connection] = []
+        self._lock = asyncio.Lock()
+
+    async def _open(self):
+        async with self._lock:
+            if self._queue is not None:
+                return
+            # Сначала пишущее соединение: оно создаёт файл БД и включает WAL,
+            # без которых read-only соединение не откроется
+            await _get_db()
+            queue = asyncio.Queue()
+            for _ in range(self._size):
+                # Без row_factory: строки — обычные кортежи, без обёртки
+                # sqlite3.Row на каждую; все читатели распаковывают их позиционно
+                db = await aiosqlite.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+                await db.executescript(_READ_PRAGMAS)
+                self._conns.append(db)
+                queue.put_nowait(db)
+            self._queue = queue
+
+    @asynccontextmanager
+    async def read(self):
+        """Берёт свободное соединение из пула на время запроса."""
+        if self._queue is None:
+            await self._open()
+        db = await self._queue.get()
+        try:
+            yield db
+        finally:
+            self._queue.put_nowait(db)
+
+    async def close(self):
+        for db in self._conns:
+            await db.close()
+        self._conns.clear()
+        self._queue = None
+
+
+_READ_POOL = _ReadPool(READ_POOL_SIZE)
+
+
+async def close_db():
+    """Закрывает общее соединение и пул чтения (при остановке бота)."""
+    global _DB
+    await _READ_POOL.close()
+    if _DB is not None:
+        await _DB.close()
+        _DB = None
+
+
 async def init_db():
     """Создаёт таблицы БД."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    db = await _get_db()
+    async with _WRITE_LOCK:
         await db.execute("""
             CREATE TABLE IF NOT EXISTS club_cards (
                 id              INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -97,12 +262,14 @@ async def init_db():
                 card_image_url  TEXT,
                 replacements    TEXT,
                 daily_donated   TEXT,
-                club_owners     TEXT,
+                club_owners     BLOB,
                 discovered_at   TEXT,
                 is_current      INTEGER DEFAULT 1
             )
         """)
 
+        await _migrate_club_owners(db)
+
         await db.execute("""
             CREATE TABLE IF NOT EXISTS users (
                 id              INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -137,10 +304,14 @@ async def init_db():
                 cancel_reason       TEXT,
                 remind_sent         INTEGER DEFAULT 0,
                 group_notified      INTEGER DEFAULT 0,
+                start_ts            INTEGER,
+                end_ts              INTEGER,
                 FOREIGN KEY (tg_id) REFERENCES users(tg_id)
             )
         """)
 
+        await _migrate_booking_timestamps(db)
+
         await db.execute("""
             CREATE TABLE IF NOT EXISTS booking_events (
                 id          INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -162,9 +333,45 @@ async def init_db():
             WHERE status IN ('pending', 'confirmed')
         """)
 
+        # Расписание и проверка пересечений: date/status — равенство,
+        # start_time/end_time берутся из индекса без чтения строки.
+        # Прежний (date, status) — префикс этого индекса, он не нужен
+        await db.execute("DROP INDEX IF EXISTS idx_bookings_date_status")
         await db.execute("""
-            CREATE INDEX IF NOT EXISTS idx_bookings_date_status
-            ON bookings(date, status)
+            CREATE INDEX IF NOT EXISTS idx_bookings_date_status_times
+            ON bookings(date, status, start_time, end_time)
+        """)
+
+        # Выборки планировщика — partial-индексы: в них только активные
+        # брони, и размер не растёт вместе с историей. Условия WHERE
+        # совпадают с литералами запросов, по start_ts/end_ts — диапазон.
+        # Прежние полные индексы удаляем из существующих баз
+        for old_index in (
+            "idx_bookings_scheduler",
+            "idx_bookings_scheduler_ts",
+            "idx_bookings_status_end_ts",
+        ):
+            await db.execute(f"DROP INDEX IF EXISTS {old_index}")
+
+        # Напоминания
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_bookings_pending_unreminded
+            ON bookings(start_ts)
+            WHERE status = 'pending' AND remind_sent = 0
+        """)
+
+        # Отмена по таймауту
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_bookings_pending_reminded
+            ON bookings(start_ts)
+            WHERE status = 'pending' AND remind_sent = 1
+        """)
+
+        # Завершение подтверждённых
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_bookings_confirmed_end
+            ON bookings(end_ts)
+            WHERE status = 'confirmed'
         """)
 
         await db.execute("""
@@ -181,83 +388,188 @@ async def init_db():
         logger.info("✅ База данных инициализирована")
 
 
+def _pack_owners(owner_ids: List[int]) -> bytes:
+    """Список ID владельцев -> BLOB."""
+    return struct.pack(f"<{len(owner_ids)}q", *owner_ids)
+
+
+def _unpack_owners(blob: Optional[bytes]) -> List[int]:
+    """BLOB -> список ID владельцев."""
+    if not blob:
+        return []
+    return [owner_id for (owner_id,) in _OWNER_ID.iter_unpack(blob)]
+
+
+async def _migrate_club_owners(db: aiosqlite.Connection):
+    """Переводит club_owners старых карт из JSON-текста в BLOB."""
+    async with db.execute(
+        "SELECT id, club_owners FROM club_cards WHERE typeof(club_owners) = 'text'"
+    ) as cursor:
+        rows = await cursor.fetchall()
+    if rows:
+        await db.executemany(
+            "UPDATE club_cards SET club_owners = ? WHERE id = ?",
+            [(_pack_owners(_json_loads(owners) if owners else []), cid) for cid, owners in rows]
+        )
+        logger.info(f"club_owners переведены в BLOB для {len(rows)} карт")
+
+
+def _booking_epochs(date: str, start_time: str, end_time: str) -> tuple:
+    """(start_ts, end_ts) брони — unix-время, считается один раз при записи."""
+    return (
+        int(parse_booking_dt(date, start_time).timestamp()),
+        int(parse_booking_dt(date, end_time).timestamp()),
+    )
+
+
+async def _migrate_booking_timestamps(db: aiosqlite.Connection):
+    """Добавляет start_ts/end_ts в старые БД и заполняет их для существующих броней."""
+    async with db.execute("PRAGMA table_info(bookings)") as cursor:
+        columns = {row[1] for row in await cursor.fetchall()}
+    for column in ("start_ts", "end_ts"):
+        if column not in columns:
+            await db.execute(f"ALTER TABLE bookings ADD COLUMN {column} INTEGER")
+
+    async with db.execute("""
+        SELECT id, date, start_time, end_time FROM bookings
+        WHERE start_ts IS NULL OR end_ts IS NULL
+    """) as cursor:
+        rows = await cursor.fetchall()
+    if rows:
+        await db.executemany(
+            "UPDATE bookings SET start_ts = ?, end_ts = ? WHERE id = ?",
+            [(*_booking_epochs(d, st, et), bid) for bid, d, st, et in rows]
+        )
+        logger.info(f"Заполнены start_ts/end_ts для {len(rows)} броней")
+
+
 # ══════════════════════════════════════════════════════════════
 # КАРТЫ КЛУБА
 # ══════════════════════════════════════════════════════════════
 
 
+_SQL_CURRENT_CARD = f"""
+    SELECT {_CLUB_CARD_COLUMNS} FROM club_cards
+    WHERE is_current = 1 ORDER BY id DESC LIMIT 1
+"""
+
+
 async def get_current_card() -> Optional[ClubCard]:
     """Получает текущую карту клуба."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            "SELECT * FROM club_cards WHERE is_current = 1 ORDER BY id DESC LIMIT 1"
-        ) as cursor:
+    async with _READ_POOL.read() as db:
+        async with db.execute(_SQL_CURRENT_CARD) as cursor:
             row = await cursor.fetchone()
             if row:
-                row_dict = dict(row)
-                row_dict["club_owners"] = json.loads(row_dict["club_owners"]) if row_dict["club_owners"] else []
-                return ClubCard(**row_dict)
-    return None
-
-
-async def insert_card(card_data: Dict[str, Any]) -> int:
-    """Вставляет новую карту."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("""
-            INSERT INTO club_cards (
-                card_id, card_rank, card_image_url,
-                replacements, daily_donated, club_owners,
-                discovered_at, is_current
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, 1)
-        """, (
-            card_data["card_id"],
-            card_data["card_rank"],
-            card_data["card_image_url"],
-            card_data["replacements"],
-            card_data["daily_donated"],
-            json.dumps(card_data["club_owners"]),
-            card_data["discovered_at"]
-        ))
+                card = ClubCard(*row)
+                card.club_owners = _unpack_owners(card.club_owners)
+                return card
+        return None
+
+
+_SQL_INSERT_CARD = """
+    INSERT INTO club_cards (
+        card_id, card_rank, card_image_url,
+        replacements, daily_donated, club_owners,
+        discovered_at, is_current
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+"""
+
+
+def _card_params(card_data: Dict[str, Any]) -> tuple:
+    return (
+        card_data["card_id"],
+        card_data["card_rank"],
+        card_data["card_image_url"],
+        card_data["replacements"],
+        card_data["daily_donated"],
+        _pack_owners(card_data["club_owners"]),
+        card_data["discovered_at"]
+    )
+
+
+async def rotate_card(card_data: Dict[str, Any]) -> int:
+    """
+    Смена карты клуба: архивирует текущую и вставляет новую одной
+    транзакцией. get_current_card не увидит ни нуля, ни двух текущих карт.
+    """
+    db = await _get_db()
+    async with _WRITE_LOCK:
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            await db.execute("UPDATE club_cards SET is_current = 0 WHERE is_current = 1")
+            cursor = await db.execute(_SQL_INSERT_CARD, _card_params(card_data))
+        except Exception:
+            await db.rollback()
+            raise
         await db.commit()
         return cursor.lastrowid
 
 
-async def archive_card(card_id: int):
-    """Архивирует карту (is_current = 0)."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "UPDATE club_cards SET is_current = 0 WHERE id = ?",
-            (card_id,)
-        )
-        await db.commit()
-
-
 # ══════════════════════════════════════════════════════════════
 # ПОЛЬЗОВАТЕЛИ
 # ══════════════════════════════════════════════════════════════
 
 
+_SQL_USER_BY_TG_ID = f"SELECT {_USER_COLUMNS} FROM users WHERE tg_id = ?"
+_SQL_ALL_USERS = f"SELECT {_USER_COLUMNS} FROM users ORDER BY created_at DESC"
+_SQL_USERS_BY_MANGABUFF_IDS = f"""
+    SELECT {_USER_COLUMNS} FROM users
+    WHERE mangabuff_id IN (SELECT value FROM json_each(?))
+"""
+
+
+# Кэш get_user: {tg_id: (время чтения, User или None)}. Каждый клик
+# по кнопкам бронирования заново проверяет пользователя — в пределах
+# USER_CACHE_TTL это обходится без запроса. Пишущие функции пользователей
+# (upsert_user, delete_user, toggle_user_active) сбрасывают запись
+USER_CACHE_TTL = 30
+_USER_CACHE_MAX = 1024
+_user_cache: Dict[int, Tuple[float, Optional[User]]] = {}
+# Счётчик записей: чтение, начатое до записи, не кладёт в кэш старые данные
+_user_writes = 0
+
+
+def _forget_user(tg_id: int):
+    """Убирает пользователя из кэша get_user."""
+    global _user_writes
+    _user_writes += 1
+    _user_cache.pop(tg_id, None)
+
+
 async def get_user(tg_id: int) -> Optional[User]:
     """Получает пользователя по Telegram ID."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            "SELECT * FROM users WHERE tg_id = ?", (tg_id,)
-        ) as cursor:
+    cached = _user_cache.get(tg_id)
+    if cached is not None and time.monotonic() - cached[0] < USER_CACHE_TTL:
+        return cached[1]
+
+    read_at = time.monotonic()
+    writes = _user_writes
+    async with _READ_POOL.read() as db:
+        async with db.execute(_SQL_USER_BY_TG_ID, (tg_id,)) as cursor:
             row = await cursor.fetchone()
-            return User(**dict(row)) if row else None
+    user = User(*row) if row else None
 
+    if writes == _user_writes:
+        if len(_user_cache) >= _USER_CACHE_MAX:
+            _user_cache.clear()
+        _user_cache[tg_id] = (read_at, user)
+    return user
 
-async def get_user_by_mangabuff_id(mangabuff_id: int) -> Optional[User]:
-    """Получает пользователя по MangaBuff ID."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            "SELECT * FROM users WHERE mangabuff_id = ?", (mangabuff_id,)
-        ) as cursor:
-            row = await cursor.fetchone()
-            return User(**dict(row)) if row else None
+
+async def get_users_by_mangabuff_ids(mangabuff_ids: List[int]) -> Dict[int, User]:
+    """
+    Получает пользователей по списку MangaBuff ID одним запросом.
+
+    Returns:
+        {mangabuff_id: User} — только найденные
+    """
+    if not mangabuff_ids:
+        return {}
+    async with _READ_POOL.read() as db:
+        async with db.execute(_SQL_USERS_BY_MANGABUFF_IDS, (_json_dumps(mangabuff_ids),)) as cursor:
+            rows = await cursor.fetchall()
+    users = [User(*row) for row in rows]
+    return {user.mangabuff_id: user for user in users}
 
 
 async def upsert_user(
@@ -273,9 +585,10 @@ async def upsert_user(
 ):
     """Создаёт или обновляет пользователя."""
     if created_at is None:
-        created_at = ts_for_db(now_msk())
+        created_at = now_for_db()
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    db = await _get_db()
+    async with _WRITE_LOCK:
         await db.execute("""
             INSERT INTO users (
                 tg_id, tg_username, tg_nickname, mangabuff_url,
@@ -294,41 +607,42 @@ async def upsert_user(
             mangabuff_id, mangabuff_nick, is_verified, is_active, created_at
         ))
         await db.commit()
+        _forget_user(tg_id)
 
 
 async def delete_user(tg_id: int):
     """Удаляет пользователя."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    db = await _get_db()
+    async with _WRITE_LOCK:
         await db.execute("DELETE FROM users WHERE tg_id = ?", (tg_id,))
         await db.commit()
+        _forget_user(tg_id)
 
 
 async def toggle_user_active(tg_id: int) -> bool:
     """Переключает is_active. Возвращает новое значение."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute(
-            "SELECT is_active FROM users WHERE tg_id = ?", (tg_id,)
-        ) as cursor:
+    db = await _get_db()
+    async with _WRITE_LOCK:
+        # Один запрос вместо SELECT + UPDATE; CASE, а не 1 - is_active,
+        # чтобы NULL, как и раньше, становился 1
+        async with db.execute("""
+            UPDATE users
+            SET is_active = CASE is_active WHEN 1 THEN 0 ELSE 1 END
+            WHERE tg_id = ?
+            RETURNING is_active
+        """, (tg_id,)) as cursor:
             row = await cursor.fetchone()
-            if not row:
-                return False
-
-            new_value = 0 if row[0] == 1 else 1
-            await db.execute(
-                "UPDATE users SET is_active = ? WHERE tg_id = ?",
-                (new_value, tg_id)
-            )
-            await db.commit()
-            return bool(new_value)
+        await db.commit()
+        _forget_user(tg_id)
+        return bool(row[0]) if row else False
 
 
 async def get_all_users() -> List[User]:
     """Получает всех пользователей."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("SELECT * FROM users ORDER BY created_at DESC") as cursor:
+    async with _READ_POOL.read() as db:
+        async with db.execute(_SQL_ALL_USERS) as cursor:
             rows = await cursor.fetchall()
-            return [User(**dict(row)) for row in rows]
+            return [User(*row) for row in rows]
 
 
 # ══════════════════════════════════════════════════════════════
@@ -350,21 +664,47 @@ async def create_booking(
 
     Raises:
         BookingConflictError: если у пользователя уже есть активная бронь на эту дату
+        BookingSlotTakenError: если слот пересекается с другой активной бронью
     """
-    created_at = ts_for_db(now_msk())
+    created_at = now_for_db()
+    start_ts, end_ts = _booking_epochs(date, start_time, end_time)
+
+    db = await _get_db()
+    async with _WRITE_LOCK:
+        # Бронь и событие 'created' — одна транзакция. IMMEDIATE берёт
+        # блокировку записи сразу, а не на первой вставке: в тот же файл
+        # пишет и соединение модуля альянса
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            # Проверка пересечения внутри той же транзакции: между ней и
+            # вставкой никто не запишет — validate_booking_slot в хендлере
+            # лишь ранний отказ, параллельные клики он не разводит
+            async with db.execute(
+                _SQL_BOOKING_CONFLICT, (date, end_time, start_time)
+            ) as cursor:
+                slot_taken = await cursor.fetchone() is not None
+            if slot_taken:
+                await db.rollback()
+                logger.warning(
+                    f"Слот занят при создании брони: tg_id={tg_id}, "
+                    f"{date} {start_time}-{end_time}"
+                )
+                raise BookingSlotTakenError(
+                    f"Слот {date} {start_time}-{end_time} уже занят"
+                )
 
-    try:
-        async with aiosqlite.connect(DB_PATH) as db:
             cursor = await db.execute("""
                 INSERT INTO bookings (
                     tg_id, tg_nickname, mangabuff_nick, date,
                     start_time, end_time, duration_hours,
-                    status, created_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', ?)
+                    status, created_at, start_ts, end_ts
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', ?, ?, ?)
             """, (
                 tg_id, tg_nickname, mangabuff_nick, date,
-                start_time, end_time, duration_hours, created_at
+                start_time, end_time, duration_hours, created_at,
+                start_ts, end_ts
             ))
+            # lastrowid — атрибут курсора, отдельного обращения к БД нет
             booking_id = cursor.lastrowid
 
             await db.execute("""
@@ -373,67 +713,137 @@ async def create_booking(
                 ) VALUES (?, 'created', ?, 'user', ?)
             """, (booking_id, tg_id, created_at))
 
-            await db.commit()
-            return booking_id
+        except IntegrityError as e:
+            # Соединение общее — незавершённую транзакцию откатываем сразу,
+            # иначе её закоммитит следующая запись
+            await db.rollback()
+            # Нарушение UNIQUE индекса: активная бронь на эту дату уже существует
+            logger.warning(
+                f"Конфликт при создании брони: tg_id={tg_id}, date={date} — {e}"
+            )
+            raise BookingConflictError(
+                f"У пользователя уже есть активная бронь на {date}"
+            ) from e
+        except BookingSlotTakenError:
+            raise
+        except Exception:
+            await db.rollback()
+            raise
 
-    except IntegrityError as e:
-        # Нарушение UNIQUE индекса: активная бронь на эту дату уже существует
-        logger.warning(
-            f"Конфликт при создании брони: tg_id={tg_id}, date={date} — {e}"
-        )
-        raise BookingConflictError(
-            f"У пользователя уже есть активная бронь на {date}"
-        ) from e
+        await db.commit()
+    return booking_id
+
+
+_SQL_BOOKING_BY_ID = f"SELECT {_BOOKING_COLUMNS} FROM bookings WHERE id = ?"
 
 
 async def get_booking(booking_id: int) -> Optional[Booking]:
     """Получает бронь по ID."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            "SELECT * FROM bookings WHERE id = ?", (booking_id,)
-        ) as cursor:
+    async with _READ_POOL.read() as db:
+        async with db.execute(_SQL_BOOKING_BY_ID, (booking_id,)) as cursor:
             row = await cursor.fetchone()
-            return Booking(**dict(row)) if row else None
+            return Booking(*row) if row else None
+
+
+# Списки дат/ID передаются одним JSON-параметром через json_each: текст
+# запроса не зависит от длины списка, поэтому это одна и та же строка,
+# которую sqlite3 берёт из кэша подготовленных запросов
+_SQL_USER_ACTIVE_BOOKINGS = f"""
+    SELECT {_BOOKING_COLUMNS} FROM bookings
+    WHERE tg_id = ? AND date IN (SELECT value FROM json_each(?))
+      AND status IN ('pending', 'confirmed')
+    ORDER BY date, start_time
+"""
+
+_SQL_BOOKINGS_FOR_SCHEDULE = f"""
+    SELECT {_BOOKING_COLUMNS} FROM bookings
+    WHERE date IN (SELECT value FROM json_each(?))
+      AND status IN ('pending', 'confirmed')
+    ORDER BY date, start_time
+"""
 
 
 async def get_user_active_bookings(tg_id: int, dates: List[str]) -> List[Booking]:
     """Получает активные брони пользователя на указанные даты."""
-    placeholders = ",".join("?" * len(dates))
-    query = f"""
-        SELECT * FROM bookings
-        WHERE tg_id = ? AND date IN ({placeholders})
-          AND status IN ('pending', 'confirmed')
-        ORDER BY date, start_time
-    """
-
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(query, (tg_id, *dates)) as cursor:
+    async with _READ_POOL.read() as db:
+        async with db.execute(_SQL_USER_ACTIVE_BOOKINGS, (tg_id, _json_dumps(dates))) as cursor:
             rows = await cursor.fetchall()
-            return [Booking(**dict(row)) for row in rows]
+            return [Booking(*row) for row in rows]
 
 
 async def get_bookings_for_schedule(dates: List[str]) -> List[Booking]:
     """Получает все активные брони на указанные даты."""
-    placeholders = ",".join("?" * len(dates))
-    query = f"""
-        SELECT * FROM bookings
-        WHERE date IN ({placeholders})
-          AND status IN ('pending', 'confirmed')
-        ORDER BY date, start_time
+    async with _READ_POOL.read() as db:
+        async with db.execute(_SQL_BOOKINGS_FOR_SCHEDULE, (_json_dumps(dates),)) as cursor:
+            rows = await cursor.fetchall()
+            return [Booking(*row) for row in rows]
+
+
+class _BookingsByDateLoader:
+    """
+    Склеивает запросы броней на дату, пришедшие в одном витке event loop:
+    когда много пользователей одновременно жмут кнопки выбора слотов,
+    вместо запроса на каждый клик уходит один get_bookings_for_schedule
+    по всем запрошенным датам, а результат раздаётся по датам.
     """
 
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(query, dates) as cursor:
-            rows = await cursor.fetchall()
-            return [Booking(**dict(row)) for row in rows]
+    def __init__(self):
+        self._pending: Dict[str, List[asyncio.Future]] = {}
+        self._scheduled = False
+        # Ссылки на задачи выборки, чтобы их не собрал GC до завершения
+        self._tasks: set = set()
+
+    def load(self, date: str) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(date, []).append(future)
+        if not self._scheduled:
+            self._scheduled = True
+            loop.call_soon(self._dispatch)
+        return future
+
+    def _dispatch(self):
+        pending, self._pending = self._pending, {}
+        self._scheduled = False
+        task = asyncio.get_running_loop().create_task(self._fetch(pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, pending: Dict[str, List[asyncio.Future]]):
+        try:
+            bookings = await get_bookings_for_schedule(list(pending))
+        except Exception as e:
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        by_date: Dict[str, List[Booking]] = {date: [] for date in pending}
+        for booking in bookings:
+            by_date[booking.date].append(booking)
+        for date, futures in pending.items():
+            for future in futures:
+                # Отменённый вызывающим future пропускаем
+                if not future.done():
+                    future.set_result(list(by_date[date]))
+
+
+_BOOKINGS_LOADER = _BookingsByDateLoader()
+
+
+async def get_bookings_for_date(date: str) -> List[Booking]:
+    """
+    Активные брони на одну дату; одновременные вызовы (в том числе на
+    разные даты) объединяются в один запрос.
+    """
+    return await _BOOKINGS_LOADER.load(date)
 
 
 async def confirm_booking(booking_id: int, confirmed_at: str):
     """Подтверждает бронь."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    db = await _get_db()
+    async with _WRITE_LOCK:
         await db.execute("""
             UPDATE bookings
             SET status = 'confirmed', confirmed_at = ?
@@ -442,14 +852,70 @@ async def confirm_booking(booking_id: int, confirmed_at: str):
         await db.commit()
 
 
-async def cancel_booking(
-    booking_id: int,
+# Общий запрос для событий пачки броней — один объект строки на все
+# вызовы, попадает в кэш подготовленных запросов sqlite3
+_SQL_INSERT_EVENT_BULK = """
+    INSERT INTO booking_events (
+        booking_id, event_type, actor_tg_id, actor_label, event_at
+    ) VALUES (?, ?, ?, ?, ?)
+"""
+
+
+async def _insert_events_bulk(
+    db: aiosqlite.Connection,
+    booking_ids: List[int],
+    event_type: str,
+    actor_label: str,
+    event_at: str,
+    actor_tg_id: Optional[int] = None
+):
+    """executemany событий в текущей транзакции (без commit)."""
+    await db.executemany(
+        _SQL_INSERT_EVENT_BULK,
+        [(bid, event_type, actor_tg_id, actor_label, event_at) for bid in booking_ids]
+    )
+
+
+async def complete_bookings_bulk(
+    booking_ids: List[int],
+    completed_at: str,
+    event_type: Optional[str] = None
+):
+    """
+    Завершает несколько броней одним UPDATE.
+    Если передан event_type — системные события пишутся в той же транзакции.
+    """
+    if not booking_ids:
+        return
+    db = await _get_db()
+    async with _WRITE_LOCK:
+        await db.execute("""
+            UPDATE bookings
+            SET status = 'completed', completed_at = ?
+            WHERE id IN (SELECT value FROM json_each(?))
+        """, (completed_at, _json_dumps(booking_ids)))
+        if event_type:
+            await _insert_events_bulk(db, booking_ids, event_type, "system", completed_at)
+        await db.commit()
+
+
+async def cancel_bookings_bulk(
+    booking_ids: List[int],
     cancelled_by: str,
     cancel_reason: str,
+    cancelled_at: Optional[str] = None,
+    event_type: Optional[str] = None,
     actor_tg_id: Optional[int] = None
 ):
-    """Отменяет бронь."""
-    cancelled_at = ts_for_db(now_msk())
+    """
+    Отменяет несколько броней одним UPDATE.
+    Если передан event_type — события (актор cancelled_by, actor_tg_id)
+    пишутся в той же транзакции.
+    """
+    if not booking_ids:
+        return
+    if cancelled_at is None:
+        cancelled_at = now_for_db()
     status_map = {
         "user": "cancelled_by_user",
         "admin": "cancelled_by_admin",
@@ -457,39 +923,58 @@ async def cancel_booking(
     }
     status = status_map.get(cancelled_by, "cancelled")
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    db = await _get_db()
+    async with _WRITE_LOCK:
         await db.execute("""
             UPDATE bookings
             SET status = ?, cancelled_at = ?, cancelled_by = ?, cancel_reason = ?
-            WHERE id = ?
-        """, (status, cancelled_at, cancelled_by, cancel_reason, booking_id))
+            WHERE id IN (SELECT value FROM json_each(?))
+        """, (status, cancelled_at, cancelled_by, cancel_reason, _json_dumps(booking_ids)))
+        if event_type:
+            await _insert_events_bulk(
+                db, booking_ids, event_type, cancelled_by, cancelled_at, actor_tg_id
+            )
         await db.commit()
 
 
-async def complete_booking(booking_id: int, completed_at: str):
-    """Завершает бронь."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("""
-            UPDATE bookings
-            SET status = 'completed', completed_at = ?
-            WHERE id = ?
-        """, (completed_at, booking_id))
+async def mark_remind_sent_bulk(
+    booking_ids: List[int],
+    event_at: Optional[str] = None
+):
+    """
+    Помечает напоминание отправленным для нескольких броней.
+    Если передан event_at — событие 'remind_sent' пишется в той же транзакции.
+    """
+    if not booking_ids:
+        return
+    db = await _get_db()
+    async with _WRITE_LOCK:
+        await db.execute(
+            "UPDATE bookings SET remind_sent = 1 WHERE id IN (SELECT value FROM json_each(?))",
+            (_json_dumps(booking_ids),)
+        )
+        if event_at:
+            await _insert_events_bulk(db, booking_ids, "remind_sent", "system", event_at)
         await db.commit()
 
 
-async def mark_remind_sent(booking_id: int):
-    """Помечает, что напоминание отправлено."""
-    async with aiosqlite.connect(DB_PATH) as db:
+async def mark_group_notified_bulk(booking_ids: List[int]):
+    """Помечает группу уведомлённой для нескольких броней."""
+    if not booking_ids:
+        return
+    db = await _get_db()
+    async with _WRITE_LOCK:
         await db.execute(
-            "UPDATE bookings SET remind_sent = 1 WHERE id = ?",
-            (booking_id,)
+            "UPDATE bookings SET group_notified = 1 WHERE id IN (SELECT value FROM json_each(?))",
+            (_json_dumps(booking_ids),)
         )
         await db.commit()
 
 
 async def mark_group_notified(booking_id: int):
     """Помечает, что группа уведомлена."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    db = await _get_db()
+    async with _WRITE_LOCK:
         await db.execute(
             "UPDATE bookings SET group_notified = 1 WHERE id = ?",
             (booking_id,)
@@ -505,9 +990,10 @@ async def add_booking_event(
     note: Optional[str] = None
 ):
     """Добавляет событие брони."""
-    event_at = ts_for_db(now_msk())
+    event_at = now_for_db()
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    db = await _get_db()
+    async with _WRITE_LOCK:
         await db.execute("""
             INSERT INTO booking_events (
                 booking_id, event_type, actor_tg_id, actor_label, note, event_at
@@ -516,67 +1002,99 @@ async def add_booking_event(
         await db.commit()
 
 
+_SQL_USER_BOOKING_HISTORY = f"""
+    SELECT {_BOOKING_COLUMNS} FROM bookings
+    WHERE tg_id = ?
+    ORDER BY created_at DESC
+    LIMIT ?
+"""
+
+_SQL_ALL_BOOKING_HISTORY = f"""
+    SELECT {_BOOKING_COLUMNS} FROM bookings
+    ORDER BY created_at DESC
+    LIMIT ?
+"""
+
+
 async def get_user_booking_history(tg_id: int, limit: int = 20) -> List[Booking]:
     """Получает историю броней пользователя."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("""
-            SELECT * FROM bookings
-            WHERE tg_id = ?
-            ORDER BY created_at DESC
-            LIMIT ?
-        """, (tg_id, limit)) as cursor:
+    async with _READ_POOL.read() as db:
+        async with db.execute(_SQL_USER_BOOKING_HISTORY, (tg_id, limit)) as cursor:
             rows = await cursor.fetchall()
-            return [Booking(**dict(row)) for row in rows]
+            return [Booking(*row) for row in rows]
 
 
 async def get_all_booking_history(limit: int = 50) -> List[Booking]:
     """Получает полную историю броней."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("""
-            SELECT * FROM bookings
-            ORDER BY created_at DESC
-            LIMIT ?
-        """, (limit,)) as cursor:
+    async with _READ_POOL.read() as db:
+        async with db.execute(_SQL_ALL_BOOKING_HISTORY, (limit,)) as cursor:
             rows = await cursor.fetchall()
-            return [Booking(**dict(row)) for row in rows]
+            return [Booking(*row) for row in rows]
 
 
-async def get_bookings_needing_reminder() -> List[Booking]:
-    """Получает брони, которым нужно отправить напоминание."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("""
-            SELECT * FROM bookings
-            WHERE status = 'pending' AND remind_sent = 0
-        """) as cursor:
-            rows = await cursor.fetchall()
-            return [Booking(**dict(row)) for row in rows]
+_SQL_BOOKINGS_NEEDING_REMINDER = f"""
+    SELECT {_BOOKING_TICK_COLUMNS} FROM bookings
+    WHERE status = 'pending' AND remind_sent = 0
+      AND start_ts BETWEEN ? AND ?
+"""
 
+_SQL_BOOKINGS_NEEDING_CANCELLATION = f"""
+    SELECT {_BOOKING_TICK_COLUMNS} FROM bookings
+    WHERE status = 'pending' AND remind_sent = 1
+      AND start_ts <= ?
+"""
 
-async def get_bookings_needing_cancellation() -> List[Booking]:
-    """Получает брони, которые нужно отменить по таймауту."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("""
-            SELECT * FROM bookings
-            WHERE status = 'pending' AND remind_sent = 1
-        """) as cursor:
-            rows = await cursor.fetchall()
-            return [Booking(**dict(row)) for row in rows]
+_SQL_BOOKINGS_TO_COMPLETE = """
+    SELECT id FROM bookings
+    WHERE status = 'confirmed' AND end_ts <= ?
+"""
 
 
-async def get_bookings_to_complete() -> List[Booking]:
-    """Получает брони, которые нужно завершить."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("""
-            SELECT * FROM bookings
-            WHERE status = 'confirmed'
-        """) as cursor:
-            rows = await cursor.fetchall()
-            return [Booking(**dict(row)) for row in rows]
+async def get_bookings_needing_reminder(start_from: int, start_to: int) -> List[BookingTick]:
+    """
+    Получает брони, которым нужно отправить напоминание:
+    start_ts в интервале [start_from, start_to] (unix-время).
+    """
+    async with _READ_POOL.read() as db:
+        async with db.execute(_SQL_BOOKINGS_NEEDING_REMINDER, (start_from, start_to)) as cursor:
+            return [BookingTick._make(row) for row in await cursor.fetchall()]
+
+
+async def get_bookings_needing_cancellation(start_before: int) -> List[BookingTick]:
+    """
+    Получает брони, которые нужно отменить по таймауту:
+    start_ts <= start_before (= сейчас минус grace).
+    """
+    async with _READ_POOL.read() as db:
+        async with db.execute(_SQL_BOOKINGS_NEEDING_CANCELLATION, (start_before,)) as cursor:
+            return [BookingTick._make(row) for row in await cursor.fetchall()]
+
+
+async def get_bookings_to_complete(now_ts: int) -> List[int]:
+    """Получает ID подтверждённых броней, время окончания которых наступило."""
+    async with _READ_POOL.read() as db:
+        async with db.execute(_SQL_BOOKINGS_TO_COMPLETE, (now_ts,)) as cursor:
+            return [row[0] for row in await cursor.fetchall()]
+
+
+# Достаточно первого пересечения — COUNT(*) перебирал бы все.
+# Два фиксированных варианта вместо склейки строки при каждом вызове
+_SQL_BOOKING_CONFLICT = """
+    SELECT 1 FROM bookings
+    WHERE date = ?
+      AND status IN ('pending', 'confirmed')
+      AND start_time < ? AND end_time > ?
+    LIMIT 1
+"""
+
+_SQL_BOOKING_CONFLICT_EXCLUDING = """
+    SELECT 1 FROM bookings
+    WHERE date = ?
+      AND status IN ('pending', 'confirmed')
+      AND start_time < ? AND end_time > ?
+      AND id != ?
+    LIMIT 1
+"""
 
 
 async def check_booking_conflict(
@@ -591,22 +1109,16 @@ async def check_booking_conflict(
     Returns:
         True если есть конфликт
     """
-    query = """
-        SELECT COUNT(*) FROM bookings
-        WHERE date = ?
-          AND status IN ('pending', 'confirmed')
-          AND NOT (end_time <= ? OR start_time >= ?)
-    """
-    params = [date, start_time, end_time]
-
     if exclude_booking_id:
-        query += " AND id != ?"
-        params.append(exclude_booking_id)
+        query = _SQL_BOOKING_CONFLICT_EXCLUDING
+        params = (date, end_time, start_time, exclude_booking_id)
+    else:
+        query = _SQL_BOOKING_CONFLICT
+        params = (date, end_time, start_time)
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _READ_POOL.read() as db:
         async with db.execute(query, params) as cursor:
-            row = await cursor.fetchone()
-            return row[0] > 0
+            return await cursor.fetchone() is not None
 
 
 # ══════════════════════════════════════════════════════════════
@@ -616,7 +1128,8 @@ async def check_booking_conflict(
 
 async def _ensure_alliance_table():
     """Создаёт таблицу альянса если её нет (миграция для существующих БД)."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    db = await _get_db()
+    async with _WRITE_LOCK:
         await db.execute("""
             CREATE TABLE IF NOT EXISTS alliance_history (
                 id            INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -634,23 +1147,33 @@ async def _ensure_alliance_table():
         await db.commit()
 
 
+# Колонки alliance_history: строки пула чтения — кортежи, dict собирается по ним
+_ALLIANCE_HISTORY_FIELDS = ("id", "slug", "title", "image_url", "manga_url", "discovered_at")
+_ALLIANCE_HISTORY_COLUMNS = ", ".join(_ALLIANCE_HISTORY_FIELDS)
+_SQL_CURRENT_ALLIANCE_MANGA = f"""
+    SELECT {_ALLIANCE_HISTORY_COLUMNS} FROM alliance_history
+    ORDER BY id DESC LIMIT 1
+"""
+_SQL_ALLIANCE_HISTORY = f"""
+    SELECT {_ALLIANCE_HISTORY_COLUMNS} FROM alliance_history
+    ORDER BY id DESC LIMIT ?
+"""
+
+
 async def get_current_alliance_manga() -> Optional[dict]:
     """Возвращает последнюю запись из истории альянса или None."""
     await _ensure_alliance_table()
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("""
-            SELECT * FROM alliance_history
-            ORDER BY id DESC LIMIT 1
-        """) as cursor:
+    async with _READ_POOL.read() as db:
+        async with db.execute(_SQL_CURRENT_ALLIANCE_MANGA) as cursor:
             row = await cursor.fetchone()
-            return dict(row) if row else None
+            return dict(zip(_ALLIANCE_HISTORY_FIELDS, row)) if row else None
 
 
 async def save_alliance_manga(manga_info: dict):
     """Сохраняет новый тайтл альянса в историю."""
     await _ensure_alliance_table()
-    async with aiosqlite.connect(DB_PATH) as db:
+    db = await _get_db()
+    async with _WRITE_LOCK:
         await db.execute("""
             INSERT INTO alliance_history (slug, title, image_url, manga_url, discovered_at)
             VALUES (?, ?, ?, ?, ?)
@@ -659,7 +1182,7 @@ async def save_alliance_manga(manga_info: dict):
             manga_info.get("title"),
             manga_info.get("image"),
             manga_info.get("url"),
-            manga_info.get("discovered_at", ts_for_db(now_msk()))
+            manga_info.get("discovered_at", now_for_db())
         ))
         await db.commit()
 
@@ -667,11 +1190,7 @@ async def save_alliance_manga(manga_info: dict):
 async def get_alliance_history(limit: int = 20) -> list:
     """Возвращает историю тайтлов альянса."""
     await _ensure_alliance_table()
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("""
-            SELECT * FROM alliance_history
-            ORDER BY id DESC LIMIT ?
-        """, (limit,)) as cursor:
+    async with _READ_POOL.read() as db:
+        async with db.execute(_SQL_ALLIANCE_HISTORY, (limit,)) as cursor:
             rows = await cursor.fetchall()
-            return [dict(row) for row in rows]
\ No newline at end of file
+            return [dict(zip(_ALLIANCE_HISTORY_FIELDS, row)) for row in rows]
\ No newline at end of file
@@ -1,13 +1,17 @@
 """Бронирование через inline-кнопки в группе."""
 
+import asyncio
+import functools
+import itertools
 import logging
+from typing import Optional, Tuple
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CallbackQueryHandler
 
 from database import (
     create_booking,
-    get_bookings_for_schedule,
-    BookingConflictError
+    BookingConflictError,
+    BookingSlotTakenError
 )
 from timezone_utils import (
     get_today_date,
@@ -25,6 +29,7 @@ from booking_validator import (
 from booking_utils import (
     get_verified_user,
     get_active_bookings_today_tomorrow,
+    get_busy_bookings_cached,
     format_active_bookings_text
 )
 
@@ -36,30 +41,29 @@ logger = logging.getLogger(__name__)
 # ══════════════════════════════════════════════════════════════
 
 
-async def show_booking_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Показывает меню выбора даты для бронирования."""
-    user = update.effective_user
+async def _render_booking_menu(tg_id: int) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+    """
+    Текст и клавиатура главного меню бронирования — общие для нового
+    сообщения (show_booking_menu) и кнопки «Назад» (handle_back_to_menu).
 
-    db_user = await get_verified_user(user.id)
+    Returns:
+        (text, reply_markup) — markup только у меню выбора даты
+    """
+    # Два независимых запроса — параллельно; брони нужны только
+    # верифицированному пользователю, иначе просто отбрасываются
+    db_user, existing = await asyncio.gather(
+        get_verified_user(tg_id),
+        get_active_bookings_today_tomorrow(tg_id)
+    )
     if not db_user:
-        await update.message.reply_text(
+        return (
             "❌ Для бронирования нужно привязать аккаунт.\n"
             "Напиши мне в личные сообщения: /start"
-        )
-        return
+        ), None
 
-    existing = await get_active_bookings_today_tomorrow(user.id)
     if existing:
-        await update.message.reply_text(
-            format_active_bookings_text(existing, for_group=True)
-        )
-        return
-
-    await _send_date_menu(update.message.reply_text)
-
+        return format_active_bookings_text(existing, for_group=True), None
 
-async def _send_date_menu(reply_fn):
-    """Вспомогательная функция: отправляет/редактирует меню выбора даты."""
     today = get_today_date()
     tomorrow = get_tomorrow_date()
 
@@ -73,11 +77,13 @@ async def _send_date_menu(reply_fn):
             callback_data=f"book_date:{tomorrow}"
         )]
     ]
+    return "📅 Выбери дату для бронирования:", InlineKeyboardMarkup(keyboard)
 
-    await reply_fn(
-        "📅 Выбери дату для бронирования:",
-        reply_markup=InlineKeyboardMarkup(keyboard)
-    )
+
+async def show_booking_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Показывает меню выбора даты для бронирования."""
+    text, markup = await _render_booking_menu(update.effective_user.id)
+    await update.message.reply_text(text, reply_markup=markup)
 
 
 # ══════════════════════════════════════════════════════════════
@@ -92,7 +98,7 @@ async def handle_date_selection(update: Update, context: ContextTypes.DEFAULT_TY
 
     date = query.data.split(":")[1]
 
-    busy_bookings = await get_bookings_for_schedule([date])
+    busy_bookings = await get_busy_bookings_cached(context, date)
     available_slots = get_available_start_slots(date, busy_bookings)
 
     if not available_slots:
@@ -132,7 +138,7 @@ async def handle_start_time_selection(update: Update, context: ContextTypes.DEFA
     # callback_data: "book_start:2026-02-16:21:00" -> ["book_start", "2026-02-16", "21", "00"]
     start_time = f"{parts[2]}:{parts[3]}"
 
-    busy_bookings = await get_bookings_for_schedule([date])
+    busy_bookings = await get_busy_bookings_cached(context, date)
     available_slots = get_available_end_slots(date, start_time, busy_bookings)
 
     if not available_slots:
@@ -174,7 +180,12 @@ async def handle_end_time_selection(update: Update, context: ContextTypes.DEFAUL
     start_time = f"{parts[2]}:{parts[3]}"
     end_time = f"{parts[4]}:{parts[5]}"
 
-    db_user = await get_verified_user(user.id)
+    # Проверка пользователя и финальная валидация слота (race condition
+    # guard) не зависят друг от друга — идут параллельно
+    db_user, (is_valid, error_msg) = await asyncio.gather(
+        get_verified_user(user.id),
+        validate_booking_slot(date, start_time, end_time)
+    )
     if not db_user:
         await query.edit_message_text(
             "❌ Для бронирования нужно привязать аккаунт.\n"
@@ -182,8 +193,6 @@ async def handle_end_time_selection(update: Update, context: ContextTypes.DEFAUL
         )
         return
 
-    # Финальная валидация (race condition guard)
-    is_valid, error_msg = await validate_booking_slot(date, start_time, end_time)
     if not is_valid:
         await query.edit_message_text(
             f"⚠️ {error_msg}\n"
@@ -203,13 +212,24 @@ async def handle_end_time_selection(update: Update, context: ContextTypes.DEFAUL
             end_time=end_time,
             duration_hours=duration_hours
         )
+    except BookingSlotTakenError:
+        context.user_data.pop("busy_bookings", None)
+        await query.edit_message_text(
+            "⚠️ Этот слот уже занят\n"
+            "Кто-то успел забронировать этот слот быстрее."
+        )
+        return
     except BookingConflictError:
+        context.user_data.pop("busy_bookings", None)
         await query.edit_message_text(
             "⚠️ У тебя уже есть бронь на этот день.\n"
             "Одна дата — одна бронь."
         )
         return
 
+    # Занятость даты изменилась — следующий выбор слотов пойдёт в БД
+    context.user_data.pop("busy_bookings", None)
+
     await query.edit_message_text(
         f"✅ Бронь успешно создана!\n\n"
         f"🃏 Назначение: внос карт в клуб\n"
@@ -237,24 +257,8 @@ async def handle_back_to_menu(update: Update, context: ContextTypes.DEFAULT_TYPE
     query = update.callback_query
     await query.answer()
 
-    user = query.from_user
-
-    db_user = await get_verified_user(user.id)
-    if not db_user:
-        await query.edit_message_text(
-            "❌ Для бронирования нужно привязать аккаунт.\n"
-            "Напиши мне в личные сообщения: /start"
-        )
-        return
-
-    existing = await get_active_bookings_today_tomorrow(user.id)
-    if existing:
-        await query.edit_message_text(
-            format_active_bookings_text(existing, for_group=True)
-        )
-        return
-
-    await _send_date_menu(query.edit_message_text)
+    text, markup = await _render_booking_menu(query.from_user.id)
+    await query.edit_message_text(text, reply_markup=markup)
 
 
 # ══════════════════════════════════════════════════════════════
@@ -262,6 +266,22 @@ async def handle_back_to_menu(update: Update, context: ContextTypes.DEFAULT_TYPE
 # ══════════════════════════════════════════════════════════════
 
 
+@functools.lru_cache(maxsize=512)
+def _slot_button_rows(slots: tuple, callback_prefix: str, per_row: int) -> tuple:
+    """
+    Ряды кнопок слотов. Кнопки PTB неизменяемы, поэтому один и тот же
+    набор слотов на ту же дату отдаётся из кэша, а не собирается заново
+    на каждый клик.
+    """
+    return tuple(
+        tuple(
+            InlineKeyboardButton(slot, callback_data=f"{callback_prefix}:{slot}")
+            for slot in chunk
+        )
+        for chunk in itertools.batched(slots, per_row)
+    )
+
+
 def _build_slots_keyboard(
     slots: list,
     callback_prefix: str,
@@ -280,20 +300,8 @@ def _build_slots_keyboard(
     Returns:
         список рядов InlineKeyboardButton
     """
-    keyboard = []
-    row = []
-    for slot in slots:
-        row.append(InlineKeyboardButton(
-            slot,
-            callback_data=f"{callback_prefix}:{slot}"
-        ))
-        if len(row) == per_row:
-            keyboard.append(row)
-            row = []
-    if row:
-        keyboard.append(row)
-
-    keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data=back_callback)])
+    keyboard = list(_slot_button_rows(tuple(slots), callback_prefix, per_row))
+    keyboard.append((InlineKeyboardButton("◀️ Назад", callback_data=back_callback),))
     return keyboard
 
 
@@ -303,18 +311,26 @@ def _build_slots_keyboard(
 
 
 def register_group_booking_handlers(application):
-    """Регистрирует handlers для бронирования в группах."""
+    """
+    Регистрирует handlers для бронирования в группах.
+
+    block=False: PTB запускает callback отдельной задачей и сразу берёт
+    следующий апдейт — пока один клик ждёт БД и edit_message_text, кнопки
+    остальных пользователей не стоят в очереди. Каждый handler первым
+    делом отвечает на callback_query, поэтому «часики» у кнопки гаснут
+    сразу; исключения задачи PTB передаёт в свою обработку ошибок.
+    """
     application.add_handler(
-        CallbackQueryHandler(handle_date_selection, pattern=r"^book_date:")
+        CallbackQueryHandler(handle_date_selection, pattern=r"^book_date:", block=False)
     )
     application.add_handler(
-        CallbackQueryHandler(handle_start_time_selection, pattern=r"^book_start:")
+        CallbackQueryHandler(handle_start_time_selection, pattern=r"^book_start:", block=False)
     )
     application.add_handler(
-        CallbackQueryHandler(handle_end_time_selection, pattern=r"^book_end:")
+        CallbackQueryHandler(handle_end_time_selection, pattern=r"^book_end:", block=False)
     )
     application.add_handler(
-        CallbackQueryHandler(handle_back_to_menu, pattern=r"^book_menu$")
+        CallbackQueryHandler(handle_back_to_menu, pattern=r"^book_menu$", block=False)
     )
 
     logger.info("✅ Handlers для группового бронирования зарегистрированы")
\ No newline at end of file
@@ -1,5 +1,6 @@
 """Пользовательские команды бота."""
 
+import asyncio
 import logging
 from telegram import Update
 from telegram.ext import ContextTypes, CommandHandler
@@ -11,9 +12,9 @@ from database import (
     get_user_booking_history,
     get_bookings_for_schedule,
     get_current_card,
-    cancel_booking,
-    add_booking_event,
-    mark_group_notified
+    cancel_bookings_bulk,
+    mark_group_notified_bulk,
+    get_alliance_history,
 )
 from timezone_utils import get_today_date, get_tomorrow_date, format_date_ru
 from schedule_view import format_schedule, format_user_history, format_user_bookings
@@ -136,25 +137,28 @@ async def cancelbooking_command(update: Update, context: ContextTypes.DEFAULT_TY
         await update.message.reply_text("📋 У тебя нет активных броней.")
         return
 
-    for booking in bookings:
-        await cancel_booking(
-            booking.id,
-            cancelled_by="user",
-            cancel_reason="Отменена пользователем",
-            actor_tg_id=user.tg_id
-        )
+    # Все брони (сегодня и завтра) — одним UPDATE с событиями в той же
+    # транзакции; пользователь и группа уведомляются параллельно
+    booking_ids = [b.id for b in bookings]
+    await cancel_bookings_bulk(
+        booking_ids,
+        cancelled_by="user",
+        cancel_reason="Отменена пользователем",
+        event_type="cancelled_user",
+        actor_tg_id=user.tg_id
+    )
 
-        await add_booking_event(
-            booking.id,
-            "cancelled_user",
-            "user",
-            actor_tg_id=user.tg_id
+    await asyncio.gather(*(
+        coro
+        for booking in bookings
+        for coro in (
+            send_booking_cancelled_to_user(context.bot, booking),
+            notify_group_booking_cancelled(context.bot, booking, "user"),
         )
+    ))
+    await mark_group_notified_bulk(booking_ids)
 
-        await send_booking_cancelled_to_user(context.bot, booking)
-        await notify_group_booking_cancelled(context.bot, booking, "user")
-        await mark_group_notified(booking.id)
-
+    for booking in bookings:
         logger.info(f"Пользователь {user.tg_nickname} отменил бронь #{booking.id}")
 
     await update.message.reply_text(
@@ -182,8 +186,6 @@ async def myhistory_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def alliancehistory_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает историю тайтлов альянса."""
-    from database import get_alliance_history
-
     history = await get_alliance_history(limit=10)
 
     if not history:
@@ -0,0 +1,11 @@
+"""Общие помощники разбора HTML-страниц mangabuff.ru (lxml)."""
+
+import re
+
+# ID пользователя из ссылки на профиль: /users/12345
+USER_ID_RE = re.compile(r"/users/(\d+)")
+
+
+def xp_class(tag: str, cls: str) -> str:
+    """XPath-условие «элемент tag содержит CSS-класс cls» (как у .cls в CSS)."""
+    return f"{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')]"
@@ -7,12 +7,13 @@ from telegram import Update
 from telegram.ext import Application, MessageHandler, filters, ConversationHandler, ContextTypes
 
 from config import TELEGRAM_BOT_TOKEN, LOGIN_EMAIL, LOGIN_PASSWORD, REQUIRED_TG_GROUP_ID
-from database import init_db, get_bookings_for_schedule
+from database import init_db, close_db, get_bookings_for_schedule
 from auth import login
 from proxy_manager import ProxyManager
 from rank_detector import RankDetectorImproved
 from parser import parse_loop
 from alliance_parser import alliance_monitor_loop
+from alliance_weekly_stats import init_alliance_module, close_alliance_db
 from registration import get_registration_handler
 from booking import get_booking_conversation_handler
 from booking_handler import BOOKING_TRIGGER, booking_trigger_handler, get_confirm_booking_handler
@@ -37,7 +38,7 @@ logger = logging.getLogger(__name__)
 
 # Regex для триггера "брони"
 SCHEDULE_TRIGGER = re.compile(
-    r'\b(брони|расписание|schedule)\b',
+    r'\b(?:брони|расписание|schedule)\b',
     re.IGNORECASE
 )
 
@@ -72,6 +73,7 @@ async def main():
 
     # Инициализация БД
     await init_db()
+    await init_alliance_module()
 
     # Инициализация прокси-менеджера
     proxy_manager = ProxyManager(enabled=False)
@@ -123,11 +125,12 @@ async def main():
 
     booking_conv_private = ConversationHandler(
         entry_points=[
+            # Дешёвые проверки типа чата — до регулярки
             MessageHandler(
                 filters.TEXT &
-                filters.Regex(BOOKING_TRIGGER) &
                 filters.ChatType.PRIVATE &
-                ~filters.COMMAND,
+                ~filters.COMMAND &
+                filters.Regex(BOOKING_TRIGGER),
                 start_booking_flow
             )
         ],
@@ -157,9 +160,9 @@ async def main():
     application.add_handler(
         MessageHandler(
             filters.TEXT &
-            filters.Regex(BOOKING_TRIGGER) &
             (filters.ChatType.GROUP | filters.ChatType.SUPERGROUP) &
-            ~filters.COMMAND,
+            ~filters.COMMAND &
+            filters.Regex(BOOKING_TRIGGER),
             show_booking_menu
         ),
         group=0
@@ -169,9 +172,9 @@ async def main():
     application.add_handler(
         MessageHandler(
             filters.TEXT &
-            filters.Regex(SCHEDULE_TRIGGER) &
             (filters.ChatType.GROUP | filters.ChatType.SUPERGROUP) &
-            ~filters.COMMAND,
+            ~filters.COMMAND &
+            filters.Regex(SCHEDULE_TRIGGER),
             handle_schedule_trigger
         ),
         group=0
@@ -237,6 +240,9 @@ async def main():
         await application.shutdown()
         logger.info("⏹ Бот остановлен")
 
+        await close_alliance_db()
+        await close_db()
+
         if hasattr(session, '_session'):
             session._session.close()
         else:
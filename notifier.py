@@ -1,12 +1,13 @@
 """Модуль уведомлений."""
 
 import logging
-from typing import Dict, Any, List, Tuple
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
 from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.error import TelegramError
 
 from config import BASE_URL, CLUB_BOOST_PATH, REQUIRED_TG_GROUP_ID, GROUP_CARD_TOPIC_ID, GROUP_ALLIANCE_TOPIC_ID
-from database import get_user_by_mangabuff_id, Booking
+from database import get_users_by_mangabuff_ids, User, Booking
 from timezone_utils import format_date_ru, format_time_range, now_msk
 
 logger = logging.getLogger(__name__)
@@ -33,9 +34,12 @@ async def notify_owners(bot: Bot, card_data: Dict[str, Any]):
 
     logger.info(f"Отправка уведомлений {len(owner_ids)} владельцам карты")
 
+    # Все владельцы — одним запросом, а не отдельным запросом на каждого
+    users = await get_users_by_mangabuff_ids(owner_ids)
+
     sent_count = 0
     for mangabuff_id in owner_ids:
-        if await send_card_notification(bot, mangabuff_id, card_data):
+        if await send_card_notification(bot, mangabuff_id, card_data, users.get(mangabuff_id)):
             sent_count += 1
 
     logger.info(f"✅ Отправлено {sent_count}/{len(owner_ids)} уведомлений")
@@ -44,7 +48,8 @@ async def notify_owners(bot: Bot, card_data: Dict[str, Any]):
 async def send_card_notification(
     bot: Bot,
     mangabuff_id: int,
-    card_data: Dict[str, Any]
+    card_data: Dict[str, Any],
+    user: Optional[User]
 ) -> bool:
     """
     Отправляет уведомление одному пользователю.
@@ -53,13 +58,12 @@ async def send_card_notification(
         bot: экземпляр Telegram бота
         mangabuff_id: ID пользователя на MangaBuff
         card_data: данные карты
+        user: пользователь бота с этим mangabuff_id (None — не зарегистрирован)
 
     Returns:
         True если успешно отправлено
     """
     try:
-        user = await get_user_by_mangabuff_id(mangabuff_id)
-
         if not user:
             logger.debug(f"Пользователь {mangabuff_id} не найден в БД")
             return False
@@ -408,13 +412,11 @@ async def notify_alliance_manga_changed(
     Returns:
         True если успешно
     """
-    from datetime import datetime as dt
-
     title = manga_info.get("title", manga_info.get("slug", "???"))
     image = manga_info.get("image")
     url = manga_info.get("url", "")
 
-    now_str = dt.now().strftime("%d.%m.%Y %H:%M:%S")
+    now_str = datetime.now().strftime("%d.%m.%Y %H:%M:%S")
 
     if is_startup:
         header = "🚀 <b>Мониторинг альянса запущен</b>"
@@ -3,15 +3,17 @@
 import logging
 import asyncio
 import re
+import time
 from typing import Optional, Dict, Any, List
 from bs4 import BeautifulSoup
+import lxml.html
 import requests
 
 from config import (
     BASE_URL, CLUB_BOOST_PATH, PARSE_INTERVAL_SECONDS,
     LOGIN_EMAIL, LOGIN_PASSWORD,
 )
-from timezone_utils import ts_for_db, now_msk
+from timezone_utils import now_for_db
 from rank_detector import RankDetectorImproved
 from weekly_stats import (
     parse_weekly_contributions,
@@ -31,6 +33,17 @@ _RELOGIN_AFTER_FAILURES = 5
 # Признаки того, что HTML — страница логина, а не буст
 _LOGIN_MARKERS = ("login-button", "form-login", "/login")
 
+# CSRF-токен стабилен в пределах сессии — перезапрашиваем не чаще раза в TTL
+_CSRF_TTL_SECONDS = 30 * 60
+
+# Статусы AJAX-ответа, при которых токен считаем протухшим
+_CSRF_STALE_STATUSES = (401, 403, 419)
+
+# Регулярки парсинга компилируются один раз при импорте
+_CARD_ID_RE  = re.compile(r'/cards/(\d+)/users')
+_FRACTION_RE = re.compile(r'(\d+)\s*/\s*(\d+)')
+_OWNER_ID_RE = re.compile(r'/users/(\d{1,7})')
+
 
 class BoostPageParser:
     """Парсер страницы boost клуба."""
@@ -41,6 +54,8 @@ class BoostPageParser:
         self.url = f"{BASE_URL}{CLUB_BOOST_PATH}"
         self._consecutive_errors = 0
         self._max_consecutive_errors = 5
+        self._csrf_token: Optional[str] = None
+        self._csrf_fetched_at: float = 0.0
 
     def _is_login_page(self, response) -> bool:
         """Возвращает True если ответ — страница авторизации, а не контент."""
@@ -72,6 +87,11 @@ class BoostPageParser:
 
             soup = BeautifulSoup(response.text, "html.parser")
 
+            # Страница та же, что нужна для CSRF — обновляем кэш бесплатно
+            meta = soup.find("meta", {"name": "csrf-token"})
+            if meta and meta.get("content"):
+                self._store_csrf(meta["content"].strip())
+
             card_id = self._extract_card_id(soup)
             if not card_id:
                 logger.error("Не удалось извлечь card_id")
@@ -92,7 +112,7 @@ class BoostPageParser:
                 "replacements":   replacements,
                 "daily_donated":  daily_donated,
                 "club_owners":    club_owners,
-                "discovered_at":  ts_for_db(now_msk()),
+                "discovered_at":  now_for_db(),
             }
 
         except (requests.exceptions.ProxyError,
@@ -107,45 +127,86 @@ class BoostPageParser:
             logger.error(f"Ошибка парсинга: {e}", exc_info=True)
             return None
 
+    def _store_csrf(self, token: str):
+        self._csrf_token      = token
+        self._csrf_fetched_at = time.monotonic()
+
+    def get_csrf_token(self, force: bool = False) -> Optional[str]:
+        """
+        Возвращает meta csrf-token страницы буста.
+
+        Токен кэшируется и перезапрашивается только по истечении TTL
+        или при force=True (например, после 419 от AJAX-эндпоинта).
+        """
+        if (
+            not force
+            and self._csrf_token
+            and time.monotonic() - self._csrf_fetched_at < _CSRF_TTL_SECONDS
+        ):
+            return self._csrf_token
+
+        inner = self.session._session if hasattr(self.session, '_session') else self.session
+
+        resp = inner.get(self.url, timeout=15)
+        if resp.status_code != 200:
+            logger.warning(f"[Weekly AJAX] GET буста вернул {resp.status_code}")
+            return None
+
+        if self._is_login_page(resp):
+            logger.warning("[Weekly AJAX] Сессия мертва — страница логина")
+            return None
+
+        tokens = lxml.html.fromstring(resp.content).xpath("//meta[@name='csrf-token']/@content")
+        if not tokens:
+            logger.warning("[Weekly AJAX] meta[name=csrf-token] не найден")
+            return None
+
+        token = tokens[0].strip()
+        if not token:
+            logger.warning("[Weekly AJAX] meta csrf-token пустой")
+            return None
+
+        self._store_csrf(token)
+        return token
+
+    def _post_weekly_ajax(self, ajax_url: str, meta_token: str):
+        inner = self.session._session if hasattr(self.session, '_session') else self.session
+        return inner.post(
+            ajax_url,
+            headers={
+                "X-CSRF-TOKEN":     meta_token,
+                "X-Requested-With": "XMLHttpRequest",
+                "Referer":          self.url,
+                "Accept":           "*/*",
+            },
+            data=None,
+            timeout=15,
+        )
+
     def fetch_weekly_ajax(self) -> Optional[str]:
         """
         Запрашивает AJAX-эндпоинт недельной статистики клуба.
+
+        CSRF-токен берётся из кэша; при 401/403/419 токен перезапрашивается
+        и POST повторяется один раз.
         """
-        inner    = self.session._session if hasattr(self.session, '_session') else self.session
         ajax_url = f"{BASE_URL}/clubs/getTopUsers?period=week"
 
         try:
-            resp = inner.get(self.url, timeout=15)
-            if resp.status_code != 200:
-                logger.warning(f"[Weekly AJAX] GET буста вернул {resp.status_code}")
-                return None
-
-            if self._is_login_page(resp):
-                logger.warning("[Weekly AJAX] Сессия мертва — страница логина")
-                return None
-
-            soup = BeautifulSoup(resp.text, "html.parser")
-            meta = soup.find("meta", {"name": "csrf-token"})
-            if not meta:
-                logger.warning("[Weekly AJAX] meta[name=csrf-token] не найден")
-                return None
-
-            meta_token = meta.get("content", "")
+            meta_token = self.get_csrf_token()
             if not meta_token:
-                logger.warning("[Weekly AJAX] meta csrf-token пустой")
                 return None
 
-            ajax_resp = inner.post(
-                ajax_url,
-                headers={
-                    "X-CSRF-TOKEN":     meta_token,
-                    "X-Requested-With": "XMLHttpRequest",
-                    "Referer":          self.url,
-                    "Accept":           "*/*",
-                },
-                data=None,
-                timeout=15,
-            )
+            ajax_resp = self._post_weekly_ajax(ajax_url, meta_token)
+
+            if ajax_resp.status_code in _CSRF_STALE_STATUSES:
+                logger.info(
+                    f"[Weekly AJAX] HTTP {ajax_resp.status_code} — обновляем CSRF-токен"
+                )
+                meta_token = self.get_csrf_token(force=True)
+                if not meta_token:
+                    return None
+                ajax_resp = self._post_weekly_ajax(ajax_url, meta_token)
 
             logger.info(f"[Weekly AJAX] POST {ajax_url} → HTTP {ajax_resp.status_code}")
 
@@ -186,16 +247,18 @@ class BoostPageParser:
             logger.warning(f"⚠️ {self._consecutive_errors} ошибок парсинга подряд")
 
     def _extract_card_id(self, soup: BeautifulSoup) -> Optional[int]:
-        link = soup.select_one('a[href*="/cards/"][href*="/users"]')
+        # find() по регулярке — обход дерева без разбора CSS-селектора
+        link = soup.find("a", href=_CARD_ID_RE)
         if link:
             href  = link.get("href", "")
-            match = re.search(r'/cards/(\d+)/users', href)
+            match = _CARD_ID_RE.search(href)
             if match:
                 return int(match.group(1))
         return None
 
     def _extract_card_image(self, soup: BeautifulSoup) -> str:
-        img = soup.select_one('.club-boost__image img')
+        wrapper = soup.find(class_="club-boost__image")
+        img = wrapper.find("img") if wrapper else None
         if img:
             src = img.get("src", "")
             if src:
@@ -204,26 +267,26 @@ class BoostPageParser:
 
     def _extract_replacements(self, soup: BeautifulSoup) -> str:
         text  = soup.get_text()
-        match = re.search(r'(\d+)\s*/\s*(\d+)', text)
+        match = _FRACTION_RE.search(text)
         if match:
             return f"{match.group(1)}/{match.group(2)}"
         return "0/10"
 
     def _extract_daily_donated(self, soup: BeautifulSoup) -> str:
         text    = soup.get_text()
-        matches = re.findall(r'(\d+)\s*/\s*(\d+)', text)
+        matches = _FRACTION_RE.findall(text)
         if len(matches) >= 2:
             return f"{matches[1][0]}/{matches[1][1]}"
         return "0/50"
 
     def _extract_club_owners(self, soup: BeautifulSoup) -> List[int]:
         owner_ids    = []
-        owners_block = soup.select_one('.club-boost__owners-list')
+        owners_block = soup.find(class_="club-boost__owners-list")
         if owners_block:
-            links = owners_block.select('a[href*="/users/"]')
+            links = owners_block.find_all("a", href=_OWNER_ID_RE)
             for link in links:
                 href  = link.get("href", "")
-                match = re.search(r'/users/(\d{1,7})', href)
+                match = _OWNER_ID_RE.search(href)
                 if match:
                     owner_ids.append(int(match.group(1)))
         return owner_ids
@@ -268,7 +331,7 @@ async def parse_loop(session: requests.Session, bot, rank_detector: RankDetector
     - Автоматическая переавторизация при смерти сессии.
     - При смене недели архивирует старую и отправляет итоговое сообщение.
     """
-    from database import get_current_card, archive_card, insert_card
+    from database import get_current_card, rotate_card
     from notifier import notify_owners, notify_group_new_card
     from card_info_parser import get_card_name, get_owners_nicknames
     from weekly_stats import get_week_contributions_from_db, ensure_weekly_tables
@@ -303,7 +366,8 @@ async def parse_loop(session: requests.Session, bot, rank_detector: RankDetector
     while True:
         try:
             current = await get_current_card()
-            data    = parser.parse()
+            # Запрос и разбор страницы — в пуле потоков, не блокируя event loop
+            data    = await loop.run_in_executor(None, parser.parse)
 
             if data:
                 consecutive_failures = 0
@@ -332,7 +396,9 @@ async def parse_loop(session: requests.Session, bot, rank_detector: RankDetector
                     )
 
                     if weekly_html:
-                        weekly_contributions = parse_weekly_contributions(weekly_html)
+                        weekly_contributions = await loop.run_in_executor(
+                            None, parse_weekly_contributions, weekly_html
+                        )
 
                         if weekly_contributions:
                             current_hash = compute_stats_hash(weekly_contributions)
@@ -366,10 +432,8 @@ async def parse_loop(session: requests.Session, bot, rank_detector: RankDetector
                     else:
                         data["card_rank"] = "?"
 
-                    if current:
-                        await archive_card(current.id)
-
-                    await insert_card(data)
+                    # Архив старой карты и вставка новой — одна транзакция
+                    await rotate_card(data)
 
                     card_name = await loop.run_in_executor(
                         None, get_card_name, session, data["card_id"]
@@ -2,6 +2,7 @@
 
 import time
 import logging
+import threading
 from typing import Optional
 import requests
 
@@ -24,40 +25,47 @@ class RateLimitedSession:
         self._session = session
         self._min_interval = min_interval
         self._last_request_time: Optional[float] = None
+        # Сессией пользуются из нескольких executor-потоков
+        self._lock = threading.Lock()
     
     def _wait_if_needed(self):
-        """Ждёт, если нужно соблюсти интервал."""
-        if self._last_request_time is None:
-            return
+        """
+        Резервирует слот для запроса и ждёт его наступления.
+
+        Слот занимается под локом, поэтому параллельные потоки
+        стартуют запросы не чаще min_interval, а сами ответы
+        ожидаются одновременно.
+        """
+        with self._lock:
+            now = time.time()
+            start = now
+            if self._last_request_time is not None:
+                start = max(now, self._last_request_time + self._min_interval)
+            self._last_request_time = start
         
-        elapsed = time.time() - self._last_request_time
-        if elapsed < self._min_interval:
-            sleep_time = self._min_interval - elapsed
+        sleep_time = start - now
+        if sleep_time > 0:
             logger.debug(f"Rate limit: ожидание {sleep_time:.2f}s")
             time.sleep(sleep_time)
     
     def get(self, *args, **kwargs):
         """GET-запрос с rate limiting."""
         self._wait_if_needed()
-        self._last_request_time = time.time()
         return self._session.get(*args, **kwargs)
     
     def post(self, *args, **kwargs):
         """POST-запрос с rate limiting."""
         self._wait_if_needed()
-        self._last_request_time = time.time()
         return self._session.post(*args, **kwargs)
     
     def put(self, *args, **kwargs):
         """PUT-запрос с rate limiting."""
         self._wait_if_needed()
-        self._last_request_time = time.time()
         return self._session.put(*args, **kwargs)
     
     def delete(self, *args, **kwargs):
         """DELETE-запрос с rate limiting."""
         self._wait_if_needed()
-        self._last_request_time = time.time()
         return self._session.delete(*args, **kwargs)
     
     def __getattr__(self, name):
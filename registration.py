@@ -15,7 +15,7 @@ from telegram.ext import (
 from config import REQUIRED_TG_GROUP_ID
 from database import upsert_user, get_user
 from club_parser import check_club_membership
-from timezone_utils import ts_for_db, now_msk
+from timezone_utils import now_for_db
 
 logger = logging.getLogger(__name__)
 
@@ -142,7 +142,7 @@ async def receive_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
         mangabuff_nick=mangabuff_nick or f"User{mangabuff_id}",
         is_verified=1,
         is_active=1,
-        created_at=ts_for_db(now_msk())
+        created_at=now_for_db()
     )
 
     await update.message.reply_text(
@@ -1,7 +1,9 @@
 """Утилиты работы с часовым поясом МСК."""
 
-import pytz
+import functools
+import time as _time
 from datetime import datetime, timedelta
+from typing import Tuple
 from config import TZ
 
 # ══════════════════════════════════════════════════════════════
@@ -20,6 +22,10 @@ WEEKDAYS_RU = {
     3: "четверг", 4: "пятница", 5: "суббота", 6: "воскресенье"
 }
 
+# (unix-время ближайшей полуночи МСК, сегодня, завтра): даты меняются раз
+# в сутки, а спрашивают их на каждый клик — пересчёт только после полуночи
+_dates_cache: Tuple[float, str, str] = (0.0, "", "")
+
 # ══════════════════════════════════════════════════════════════
 # ОСНОВНЫЕ ФУНКЦИИ
 # ══════════════════════════════════════════════════════════════
@@ -33,15 +39,23 @@ def now_msk() -> datetime:
 def to_msk(dt: datetime) -> datetime:
     """Конвертирует datetime в МСК."""
     if dt.tzinfo is None:
-        return TZ.localize(dt)
+        return dt.replace(tzinfo=TZ)
     return dt.astimezone(TZ)
 
 
 def ts_for_db(dt: datetime) -> str:
     """ISO-строка для хранения в БД."""
+    # now_msk() и parse_booking_dt уже дают МСК — без лишнего astimezone
+    if dt.tzinfo is TZ:
+        return dt.isoformat()
     return to_msk(dt).isoformat()
 
 
+def now_for_db() -> str:
+    """Текущее время МСК ISO-строкой для БД (= ts_for_db(now_msk()))."""
+    return datetime.now(TZ).isoformat()
+
+
 def parse_booking_dt(date: str, time: str) -> datetime:
     """
     Парсит дату и время брони в datetime МСК.
@@ -53,8 +67,7 @@ def parse_booking_dt(date: str, time: str) -> datetime:
     Returns:
         datetime с timezone МСК
     """
-    dt = datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M")
-    return TZ.localize(dt)
+    return datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M").replace(tzinfo=TZ)
 
 
 # ══════════════════════════════════════════════════════════════
@@ -62,6 +75,7 @@ def parse_booking_dt(date: str, time: str) -> datetime:
 # ══════════════════════════════════════════════════════════════
 
 
+@functools.lru_cache(maxsize=64)
 def format_date_ru(date_str: str) -> str:
     """
     Форматирует дату в русский формат.
@@ -76,6 +90,7 @@ def format_date_ru(date_str: str) -> str:
     return f"{dt.day} {MONTHS_RU[dt.month]}"
 
 
+@functools.lru_cache(maxsize=64)
 def format_date_with_weekday(date_str: str) -> str:
     """
     Форматирует дату с днём недели.
@@ -130,14 +145,26 @@ def format_time_range(start: str, end: str) -> str:
 # ══════════════════════════════════════════════════════════════
 
 
+def _today_and_tomorrow() -> Tuple[str, str]:
+    """Сегодня и завтра (YYYY-MM-DD) из кэша, действующего до полуночи МСК."""
+    global _dates_cache
+    if _time.time() < _dates_cache[0]:
+        return _dates_cache[1], _dates_cache[2]
+    today = now_msk().date()
+    tomorrow = today + timedelta(days=1)
+    midnight = datetime.combine(tomorrow, datetime.min.time(), tzinfo=TZ).timestamp()
+    _dates_cache = (midnight, today.isoformat(), tomorrow.isoformat())
+    return _dates_cache[1], _dates_cache[2]
+
+
 def get_today_date() -> str:
     """Возвращает сегодняшнюю дату в формате YYYY-MM-DD."""
-    return now_msk().date().isoformat()
+    return _today_and_tomorrow()[0]
 
 
 def get_tomorrow_date() -> str:
     """Возвращает завтрашнюю дату в формате YYYY-MM-DD."""
-    return (now_msk().date() + timedelta(days=1)).isoformat()
+    return _today_and_tomorrow()[1]
 
 
 def calculate_duration_hours(start_time: str, end_time: str) -> float:
@@ -2,24 +2,38 @@
 Модуль недельной статистики вкладов в клуб.
 """
 
+import asyncio
 import hashlib
 import logging
-import re
 from datetime import datetime, timedelta
+from operator import itemgetter
 from typing import List, Dict, Optional
 
 import aiosqlite
-from bs4 import BeautifulSoup
+import lxml.html
+from lxml.etree import ParserError, XPath
 from telegram import Bot
 from telegram.error import TelegramError
 
 from config import BASE_URL, REQUIRED_TG_GROUP_ID, GROUP_CARD_TOPIC_ID
-from timezone_utils import now_msk, ts_for_db
+from html_utils import USER_ID_RE, xp_class
+from timezone_utils import now_msk, now_for_db
 
 logger = logging.getLogger(__name__)
 DB_PATH = "bot_data.db"
 
 
+# CSS-селекторы топа переведены в XPath и компилируются один раз при импорте
+_XP_ITEMS    = XPath("//" + xp_class("*", "club-boost__top-item"))
+_XP_POSITION = XPath(".//" + xp_class("*", "club-boost__top-position"))
+_XP_NAME     = XPath(".//" + xp_class("a", "club-boost__top-name"))
+_XP_CONTRIB  = XPath(".//" + xp_class("*", "club-boost__top-contribution"))
+
+# Таблицы создаются один раз; повторные ensure_weekly_tables() — без обращения к БД
+_tables_ready = False
+_tables_lock  = asyncio.Lock()
+
+
 # ══════════════════════════════════════════════════════════════
 # УТИЛИТЫ НЕДЕЛИ
 # ══════════════════════════════════════════════════════════════
@@ -50,47 +64,55 @@ def format_week_range(week_start: str) -> str:
 
 
 async def ensure_weekly_tables():
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS weekly_contributions (
-                id              INTEGER PRIMARY KEY AUTOINCREMENT,
-                week_start      TEXT NOT NULL,
-                mangabuff_id    INTEGER NOT NULL,
-                nick            TEXT NOT NULL,
-                profile_url     TEXT,
-                contribution    INTEGER NOT NULL DEFAULT 0,
-                recorded_at     TEXT NOT NULL,
-                UNIQUE(week_start, mangabuff_id)
-            )
-        """)
-        await db.execute("""
-            CREATE INDEX IF NOT EXISTS idx_weekly_week_start
-            ON weekly_contributions(week_start, contribution DESC)
-        """)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS pinned_weekly_message (
-                id          INTEGER PRIMARY KEY AUTOINCREMENT,
-                chat_id     INTEGER NOT NULL UNIQUE,
-                thread_id   INTEGER,
-                message_id  INTEGER NOT NULL,
-                week_start  TEXT NOT NULL,
-                updated_at  TEXT NOT NULL
-            )
-        """)
-        # ── Архив завершённых недель ─────────────────────────
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS weekly_contributions_archive (
-                id                  INTEGER PRIMARY KEY AUTOINCREMENT,
-                week_start          TEXT NOT NULL UNIQUE,
-                week_end            TEXT NOT NULL,
-                message_text        TEXT NOT NULL,
-                total_contributions INTEGER NOT NULL DEFAULT 0,
-                participants_count  INTEGER NOT NULL DEFAULT 0,
-                archived_at         TEXT NOT NULL,
-                tg_message_id       INTEGER
-            )
-        """)
-        await db.commit()
+    """Создаёт таблицы недельной статистики; DDL выполняется один раз на процесс."""
+    global _tables_ready
+    if _tables_ready:
+        return
+    async with _tables_lock:
+        if _tables_ready:
+            return
+        async with aiosqlite.connect(DB_PATH) as db:
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS weekly_contributions (
+                    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+                    week_start      TEXT NOT NULL,
+                    mangabuff_id    INTEGER NOT NULL,
+                    nick            TEXT NOT NULL,
+                    profile_url     TEXT,
+                    contribution    INTEGER NOT NULL DEFAULT 0,
+                    recorded_at     TEXT NOT NULL,
+                    UNIQUE(week_start, mangabuff_id)
+                )
+            """)
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_weekly_week_start
+                ON weekly_contributions(week_start, contribution DESC)
+            """)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS pinned_weekly_message (
+                    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id     INTEGER NOT NULL UNIQUE,
+                    thread_id   INTEGER,
+                    message_id  INTEGER NOT NULL,
+                    week_start  TEXT NOT NULL,
+                    updated_at  TEXT NOT NULL
+                )
+            """)
+            # ── Архив завершённых недель ─────────────────────────
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS weekly_contributions_archive (
+                    id                  INTEGER PRIMARY KEY AUTOINCREMENT,
+                    week_start          TEXT NOT NULL UNIQUE,
+                    week_end            TEXT NOT NULL,
+                    message_text        TEXT NOT NULL,
+                    total_contributions INTEGER NOT NULL DEFAULT 0,
+                    participants_count  INTEGER NOT NULL DEFAULT 0,
+                    archived_at         TEXT NOT NULL,
+                    tg_message_id       INTEGER
+                )
+            """)
+            await db.commit()
+        _tables_ready = True
 
 
 # ══════════════════════════════════════════════════════════════
@@ -99,36 +121,37 @@ async def ensure_weekly_tables():
 
 
 def parse_weekly_contributions(html: str) -> List[Dict]:
-    soup  = BeautifulSoup(html, "html.parser")
-    items = soup.select(".club-boost__top-item")
+    # lxml бросает ParserError на ответе без элементов (пустом или из одних
+    # комментариев) — это тот же случай «топ не найден»
+    try:
+        items = _XP_ITEMS(lxml.html.fromstring(html)) if html.strip() else []
+    except ParserError:
+        items = []
     if not items:
         logger.warning("Не найдены .club-boost__top-item в ответе недельной статистики")
         return []
 
     results = []
     for item in items:
-        pos_el = item.select_one(".club-boost__top-position")
-        try:
-            position = int(pos_el.text.strip()) if pos_el else 0
-        except ValueError:
-            position = 0
+        pos_els = _XP_POSITION(item)
+        pos_txt = pos_els[0].text_content().strip() if pos_els else ""
+        position = int(pos_txt) if pos_txt.isdecimal() else 0
 
-        name_link = item.select_one("a.club-boost__top-name")
-        if not name_link:
+        name_links = _XP_NAME(item)
+        if not name_links:
             continue
+        name_link = name_links[0]
 
-        nick = name_link.text.strip()
+        nick = name_link.text_content().strip()
         href = name_link.get("href", "")
 
-        match        = re.search(r"/users/(\d+)", href)
+        match        = USER_ID_RE.search(href)
         mangabuff_id = int(match.group(1)) if match else 0
         profile_url  = f"{BASE_URL}{href}" if href.startswith("/") else href
 
-        contrib_el = item.select_one(".club-boost__top-contribution")
-        try:
-            contribution = int(contrib_el.text.strip()) if contrib_el else 0
-        except ValueError:
-            contribution = 0
+        contrib_els = _XP_CONTRIB(item)
+        contrib_txt = contrib_els[0].text_content().strip() if contrib_els else ""
+        contribution = int(contrib_txt) if contrib_txt.isdecimal() else 0
 
         results.append({
             "position":     position,
@@ -143,11 +166,12 @@ def parse_weekly_contributions(html: str) -> List[Dict]:
 
 
 def compute_stats_hash(contributions: List[Dict]) -> str:
-    data = ",".join(
-        f"{c['mangabuff_id']}:{c['contribution']}"
-        for c in contributions
-    )
-    return hashlib.md5(data.encode()).hexdigest()
+    # Дайджест нужен только для сравнения — потоковый blake2b без общей строки.
+    # Сортировка по id: порядок из БД и со страницы не должен влиять на хеш
+    h = hashlib.blake2b(digest_size=16)
+    for c in sorted(contributions, key=itemgetter("mangabuff_id")):
+        h.update(f"{c['mangabuff_id']}:{c['contribution']},".encode())
+    return h.hexdigest()
 
 
 # ══════════════════════════════════════════════════════════════
@@ -157,7 +181,7 @@ def compute_stats_hash(contributions: List[Dict]) -> str:
 
 async def save_weekly_contributions(week_start: str, contributions: List[Dict]):
     await ensure_weekly_tables()
-    recorded_at = ts_for_db(now_msk())
+    recorded_at = now_for_db()
 
     async with aiosqlite.connect(DB_PATH) as db:
         for c in contributions:
@@ -257,7 +281,7 @@ async def archive_weekly_stats(week_start: str, contributions: List[Dict]) -> Op
                 archived_at         = excluded.archived_at
         """, (
             week_start, week_end, text,
-            total, len(contributions), ts_for_db(now_msk()),
+            total, len(contributions), now_for_db(),
         ))
         await db.commit()
 
@@ -352,7 +376,7 @@ async def save_pinned_message_info(
                 message_id = excluded.message_id,
                 week_start = excluded.week_start,
                 updated_at = excluded.updated_at
-        """, (chat_id, thread_id, message_id, week_start, ts_for_db(now_msk())))
+        """, (chat_id, thread_id, message_id, week_start, now_for_db()))
         await db.commit()
 
 
@@ -467,20 +491,26 @@ async def send_or_update_weekly_pinned(
             message_thread_id=thread_id,
             disable_web_page_preview=True,
         )
-        try:
-            await bot.pin_chat_message(
-                chat_id=chat_id,
-                message_id=msg.message_id,
-                disable_notification=True,
-            )
-            logger.info("📌 Новое сообщение статистики закреплено")
-        except TelegramError as e:
-            logger.warning(
-                f"Не удалось закрепить сообщение: {e}\n"
-                "Убедись что бот — администратор с правом 'Закреплять сообщения'"
-            )
 
-        await save_pinned_message_info(chat_id, thread_id, msg.message_id, week_start)
+        async def _pin():
+            try:
+                await bot.pin_chat_message(
+                    chat_id=chat_id,
+                    message_id=msg.message_id,
+                    disable_notification=True,
+                )
+                logger.info("📌 Новое сообщение статистики закреплено")
+            except TelegramError as e:
+                logger.warning(
+                    f"Не удалось закрепить сообщение: {e}\n"
+                    "Убедись что бот — администратор с правом 'Закреплять сообщения'"
+                )
+
+        # Закрепление и запись в БД не зависят друг от друга
+        await asyncio.gather(
+            _pin(),
+            save_pinned_message_info(chat_id, thread_id, msg.message_id, week_start),
+        )
         logger.info("✅ Новое закреплённое сообщение недельной статистики отправлено")
 
     except TelegramError as e: